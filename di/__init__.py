@@ -8,19 +8,30 @@ from urlparse import urlparse
 import breakpoints
 from breakpoints import BreakpointListener
 import debugger
-from debugger import DebuggerListener
+from debugger import DebuggerListener, ExceptionBreakMode
+import paths
+from paths import PathMapper
 import provider
+import sourcemap
+from sourcemap import SourceMapCache
 import util
 import v8
+import watches
+from watches import WatchListener
 import webkit
 
 
 __all__ = [
     'create_provider',
     'load_breakpoint_list',
+    'load_watch_list',
     'cleanup_module',
     'BreakpointListener',
     'DebuggerListener',
+    'ExceptionBreakMode',
+    'PathMapper',
+    'SourceMapCache',
+    'WatchListener',
     ]
 
 
@@ -65,6 +76,23 @@ def load_breakpoint_list(path, listener):
   return breakpoint_list
 
 
+def load_watch_list(path, listener):
+  """Loads (or creates) a watch list.
+  Like the breakpoint list, a watch list should live for the entire lifetime of
+  the editor and is shared by all debuggers.
+
+  Args:
+    path: Watch settings file path.
+    listener: WatchListener to receive events.
+
+  Returns:
+    A WatchList for managing watch expressions across all debuggers.
+  """
+  watch_list = watches.WatchList(listener)
+  watch_list.load(path)
+  return watch_list
+
+
 def cleanup_module():
   """Cleans up the module before a reload.
   This will close all debugger connections and prepare the module for reloading.
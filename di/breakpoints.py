@@ -3,10 +3,15 @@
 __author__ = 'benvanik@google.com (Ben Vanik)'
 
 
+import bisect
+import contextlib
 import json
 import os
 import sublime
 
+from .debugger import ExceptionBreakMode
+from .util import replace_file
+
 
 class BreakpointListener(object):
   """Breakpoint list event listener.
@@ -42,13 +47,122 @@ class BreakpointListener(object):
     """
     pass
 
+  def on_breakpoints_move(self, breakpoints):
+    """Handles location breakpoints moving to new lines.
+    By default each breakpoint is treated as changed.
+
+    Args:
+      breakpoints: A list of Breakpoints that moved.
+    """
+    for breakpoint in breakpoints:
+      self.on_breakpoint_change(breakpoint)
+
+  def on_breakpoints_change(self, change_set):
+    """Handles a batch of breakpoint changes.
+    By default each change in the set is dispatched individually.
+
+    Args:
+      change_set: BreakpointChangeSet with all changes made in the batch.
+    """
+    for breakpoint in change_set.removed():
+      self.on_breakpoint_remove(breakpoint)
+    for breakpoint in change_set.added():
+      self.on_breakpoint_add(breakpoint)
+    for breakpoint in change_set.changed():
+      self.on_breakpoint_change(breakpoint)
+    if len(change_set.moved()):
+      self.on_breakpoints_move(change_set.moved())
+
+  def on_exception_break_mode_change(self, mode):
+    """Handles changes to the exception break mode.
+
+    Args:
+      mode: New ExceptionBreakMode value.
+    """
+    pass
+
+
+class BreakpointChangeSet(object):
+  """An aggregated set of breakpoint changes made in a batch.
+  Changes are merged so that each breakpoint appears at most once: a
+  breakpoint added and then removed in the same batch does not appear at all,
+  and changes to an added breakpoint are included in the add.
+  """
+  def __init__(self, *args, **kwargs):
+    # Breakpoints by Breakpoint.id()
+    self._added = {}
+    self._changed = {}
+    self._moved = {}
+    self._removed = {}
+
+  def added(self):
+    return self._added.values()
+
+  def changed(self):
+    return self._changed.values()
+
+  def moved(self):
+    return self._moved.values()
+
+  def removed(self):
+    return self._removed.values()
+
+  def is_empty(self):
+    return not (len(self._added) or len(self._changed) or len(self._moved) or
+                len(self._removed))
+
+  def uris(self):
+    """Gets the URIs of all files with location breakpoints in the set.
+
+    Returns:
+      A list of URIs.
+    """
+    uris = set()
+    for breakpoints in [self._added, self._changed, self._moved,
+                        self._removed]:
+      for breakpoint in breakpoints.values():
+        if breakpoint.type() == 'location':
+          uris.add(breakpoint.location()[0])
+    return list(uris)
+
+  def _add(self, breakpoint):
+    self._added[breakpoint.id()] = breakpoint
+
+  def _change(self, breakpoint):
+    if (breakpoint.id() in self._added or
+        breakpoint.id() in self._moved):
+      # Already sent with its latest state
+      return
+    self._changed[breakpoint.id()] = breakpoint
+
+  def _move(self, breakpoint):
+    if breakpoint.id() in self._added:
+      return
+    self._changed.pop(breakpoint.id(), None)
+    self._moved[breakpoint.id()] = breakpoint
+
+  def _remove(self, breakpoint):
+    if breakpoint.id() in self._added:
+      del self._added[breakpoint.id()]
+      return
+    self._changed.pop(breakpoint.id(), None)
+    self._moved.pop(breakpoint.id(), None)
+    self._removed[breakpoint.id()] = breakpoint
+
 
 class BreakpointList(object):
   """A serializable list of breakpoints.
   Breakpoints are retained across debugging sessions in this type, and by
   ensuring all breakpoint management flows through this list it's possible to
   have consistent UI preserved across sessions.
+
+  Changes are persisted by appending records to a journal next to the snapshot
+  file, so the cost of a change does not depend on the size of the list. The
+  journal is periodically compacted into a new snapshot.
   """
+  # Minimum number of journal records before the journal is compacted
+  _MIN_COMPACTION_RECORDS = 64
+
   def __init__(self, listener, *args, **kwargs):
     """Initializes a breakpoint list.
 
@@ -57,17 +171,82 @@ class BreakpointList(object):
     """
     self._listener = listener
     self._listener._breakpoint_list = self
-    self._is_dirty = True
-    self._save_pending = False
     self._path = None
+    # Journal records not yet written, flushed on the next tick
+    self._pending_records = []
+    self._flush_pending = False
+    # Number of records in the journal file since the last compaction
+    self._journal_record_count = 0
     self._next_id = 0
     self._breakpoints = {}
     self._breakpoints_by_location = {}
     self._breakpoints_by_function = {}
+    # Sorted (line, column, id) keys of location breakpoints, by URI
+    self._breakpoint_keys_by_uri = {}
+    # Breakpoints in each group as dicts by Breakpoint.id(), by group name
+    self._breakpoints_by_group = {}
+    # Nesting depth of begin_batch calls, and the changes made in the batch
+    self._batch_depth = 0
+    self._change_set = None
+    self._exception_break_mode = ExceptionBreakMode.DEFAULT
 
   def breakpoints(self):
     return self._breakpoints.values()
 
+  def exception_break_mode(self):
+    return self._exception_break_mode
+
+  def set_exception_break_mode(self, value):
+    """Sets which exceptions debuggers should break on.
+    The mode is persisted with the list and applied to all debuggers.
+
+    Args:
+      value: An ExceptionBreakMode value.
+    """
+    if self._exception_break_mode == value:
+      return
+    self._exception_break_mode = value
+    self._append_record({
+        'op': 'exception_break_mode',
+        'mode': value,
+        })
+    self._listener.on_exception_break_mode_change(value)
+
+  def begin_batch(self):
+    """Begins a batch of changes.
+    Until the matching commit call no per-breakpoint events are fired. Instead
+    all changes are aggregated and delivered in a single on_breakpoints_change
+    event. Batches may be nested.
+    """
+    if not self._batch_depth:
+      self._change_set = BreakpointChangeSet()
+    self._batch_depth += 1
+
+  def commit(self):
+    """Ends a batch of changes, notifying the listener of all of them.
+    """
+    self._batch_depth -= 1
+    if self._batch_depth:
+      return
+    change_set = self._change_set
+    self._change_set = None
+    if not change_set.is_empty():
+      self._listener.on_breakpoints_change(change_set)
+
+  def is_batching(self):
+    return self._batch_depth > 0
+
+  @contextlib.contextmanager
+  def batch(self):
+    """Makes the changes in a with block as a single batch.
+    The batch is committed even if the block raises.
+    """
+    self.begin_batch()
+    try:
+      yield
+    finally:
+      self.commit()
+
   def _get_next_id(self):
     """Gets the next ID that can be used for a breakpoint.
 
@@ -81,83 +260,278 @@ class BreakpointList(object):
         break
     return next_id
 
+  def _journal_path(self):
+    return self._path + '.journal'
+
+  def _compaction_threshold(self):
+    """Gets the number of journal records that triggers a compaction.
+    Scaling with the list size keeps the amortized cost of compaction constant
+    per mutation.
+
+    Returns:
+      A record count.
+    """
+    return max(self._MIN_COMPACTION_RECORDS, len(self._breakpoints))
+
   def load(self, path):
     """Loads the breakpoint list.
+    The snapshot is loaded first and then the journal of changes made since the
+    last compaction is replayed on top of it.
 
     Args:
       path: Path to load from.
     """
-    self._is_dirty = False
     self._path = path
-    try:
-      with open(self._path, 'r') as f:
-        blob = json.loads(f.read())
-    except:
-      blob = {}
+    blob = None
+    # If a compaction was interrupted on Windows the snapshot may only exist
+    # in its temporary file
+    for snapshot_path in [self._path, self._path + '.tmp']:
+      try:
+        with open(snapshot_path, 'r') as f:
+          blob = json.loads(f.read())
+        break
+      except:
+        pass
+    blob = blob or {}
+    self._exception_break_mode = blob.get('exception_break_mode',
+                                          self._exception_break_mode)
     breakpoint_objs = blob.get('breakpoints', [])
     for breakpoint_obj in breakpoint_objs:
-      breakpoint = Breakpoint(
-          self,
-          breakpoint_obj['id'],
-          location=breakpoint_obj.get('location', None),
-          function_name=breakpoint_obj.get('function_name', None))
-      self._breakpoints[breakpoint.id()] = breakpoint
-      if breakpoint.type() == 'location':
-        self._breakpoints_by_location[breakpoint.location()] = breakpoint
-      elif breakpoint.type() == 'function':
-        self._breakpoints_by_function[breakpoint.function_name()] = breakpoint
-      breakpoint.set_display_name(breakpoint_obj['display_name'])
-      breakpoint.set_enabled(breakpoint_obj['is_enabled'])
-      breakpoint.set_condition(breakpoint_obj['condition'])
+      self._restore_breakpoint(breakpoint_obj)
+
+    self._journal_record_count = 0
+    is_torn = False
+    try:
+      with open(self._journal_path(), 'r') as f:
+        for line in f:
+          try:
+            record = json.loads(line)
+          except ValueError:
+            # Partial record from a crash mid-append - nothing can follow it
+            is_torn = True
+            break
+          self._replay_record(record)
+          self._journal_record_count += 1
+    except IOError:
+      pass
+    # Compact now if the journal has grown too large or is damaged, as appending
+    # after a partial record would corrupt the next one
+    if is_torn or self._journal_record_count > self._compaction_threshold():
+      self.save()
+
+  def _replay_record(self, record):
+    """Applies a journal record to the list.
+    Records contain complete state, so replaying one that is already reflected
+    in the snapshot is harmless.
+
+    Args:
+      record: Journal record dict.
+    """
+    op = record.get('op', None)
+    if op == 'add' or op == 'change':
+      self._restore_breakpoint(record['breakpoint'])
+    elif op == 'remove':
+      breakpoint = self._breakpoints.get(record['id'], None)
+      if breakpoint:
+        self._unindex_breakpoint(breakpoint)
+    elif op == 'exception_break_mode':
+      self._exception_break_mode = record['mode']
+
+  def _serialize_breakpoint(self, breakpoint):
+    """Serializes a breakpoint for the snapshot or journal.
+
+    Args:
+      breakpoint: Breakpoint.
+
+    Returns:
+      A JSON-compatible dict.
+    """
+    breakpoint_obj = {
+        'id': breakpoint.id(),
+        'display_name': breakpoint.display_name(),
+        'is_enabled': breakpoint.is_enabled(),
+        'condition': breakpoint.condition(),
+        }
+    if breakpoint.group():
+      breakpoint_obj['group'] = breakpoint.group()
+    if breakpoint.type() == 'location':
+      breakpoint_obj['location'] = breakpoint.location()
+    elif breakpoint.type() == 'function':
+      breakpoint_obj['function_name'] = breakpoint.function_name()
+    return breakpoint_obj
+
+  def _restore_breakpoint(self, breakpoint_obj):
+    """Restores a serialized breakpoint, replacing any with the same ID.
+    No events are fired.
+
+    Args:
+      breakpoint_obj: Dict from _serialize_breakpoint.
+    """
+    existing_breakpoint = self._breakpoints.get(breakpoint_obj['id'], None)
+    if existing_breakpoint:
+      self._unindex_breakpoint(existing_breakpoint)
+    breakpoint = Breakpoint(
+        self,
+        breakpoint_obj['id'],
+        location=breakpoint_obj.get('location', None),
+        function_name=breakpoint_obj.get('function_name', None))
+    # Assigned directly, as the setters would journal the change again
+    breakpoint._display_name = breakpoint_obj.get('display_name', None)
+    breakpoint._is_enabled = breakpoint_obj.get('is_enabled', True)
+    breakpoint._condition = breakpoint_obj.get('condition', None)
+    breakpoint._group = breakpoint_obj.get('group', None)
+    self._index_breakpoint(breakpoint)
 
   def save(self, path=None):
-    """Saves the breakpoint list.
+    """Saves a snapshot of the breakpoint list and truncates the journal.
+    This happens automatically when the journal grows too large. The snapshot is
+    written to a temporary file and then moved into place, so a crash leaves
+    either the old or new snapshot intact.
 
     Args:
       path: A new path to save to. Omit to use the past last loaded from.
     """
-    self._save_pending = False
     if not path and not self._path:
       print 'STDI: no path specified for save'
       return
     if path:
       self._path = path
-    if not self._is_dirty:
-      return
-    self._is_dirty = False
+    # The snapshot includes anything not yet flushed to the journal
+    self._pending_records = []
     breakpoint_objs = []
     for breakpoint in self._breakpoints.values():
-      breakpoint_obj = {
-          'id': breakpoint.id(),
-          'display_name': breakpoint.display_name(),
-          'is_enabled': breakpoint.is_enabled(),
-          'condition': breakpoint.condition(),
-          }
-      if breakpoint.type() == 'location':
-        breakpoint_obj['location'] = breakpoint.location()
-      elif breakpoint.type() == 'function':
-        breakpoint_obj['function_name'] = breakpoint.function_name()
-      breakpoint_objs.append(breakpoint_obj)
-
-    with open(self._path, 'w') as f:
+      breakpoint_objs.append(self._serialize_breakpoint(breakpoint))
+
+    temp_path = self._path + '.tmp'
+    with open(temp_path, 'w') as f:
       f.write(json.dumps({
+          'exception_break_mode': self._exception_break_mode,
           'breakpoints': breakpoint_objs,
           }))
+      f.flush()
+      os.fsync(f.fileno())
+    replace_file(temp_path, self._path)
 
-  def _add_breakpoint(self, breakpoint):
-    """Adds a breakpoint.
-    The breakpoint must already be initialized.
+    # If this fails the journal is replayed over the new snapshot on next load,
+    # which is harmless
+    try:
+      os.remove(self._journal_path())
+    except OSError:
+      pass
+    self._journal_record_count = 0
+
+  def _append_record(self, record):
+    """Queues a record to be appended to the journal.
+    Records are flushed on the next tick - this prevents excessive writes when
+    heavily manipulating breakpoints.
 
     Args:
-      breakpoint: Breakpoint to add.
+      record: Journal record dict.
+    """
+    self._pending_records.append(record)
+    if not self._flush_pending:
+      self._flush_pending = True
+      sublime.set_timeout(lambda: self._flush_journal(), 0)
+
+  def _flush_journal(self):
+    """Appends all pending records to the journal, compacting if needed.
+    """
+    self._flush_pending = False
+    if not self._pending_records:
+      return
+    if not self._path:
+      print 'STDI: no path specified for save'
+      return
+    records = self._pending_records
+    self._pending_records = []
+    self._journal_record_count += len(records)
+    if self._journal_record_count > self._compaction_threshold():
+      self.save()
+      return
+    lines = [json.dumps(record) + '\n' for record in records]
+    with open(self._journal_path(), 'a') as f:
+      f.write(''.join(lines))
+
+  def _index_breakpoint(self, breakpoint):
+    """Adds a breakpoint to the lookup tables.
+
+    Args:
+      breakpoint: Breakpoint.
     """
     self._breakpoints[breakpoint.id()] = breakpoint
     if breakpoint.type() == 'location':
+      (uri, line, column) = breakpoint.location()
       self._breakpoints_by_location[breakpoint.location()] = breakpoint
+      keys = self._breakpoint_keys_by_uri.setdefault(uri, [])
+      bisect.insort(keys, (line, column, breakpoint.id()))
     elif breakpoint.type() == 'function':
       self._breakpoints_by_function[breakpoint.function_name()] = breakpoint
-    self._invalidate()
-    self._listener.on_breakpoint_add(breakpoint)
+    if breakpoint.group():
+      self._breakpoints_by_group.setdefault(breakpoint.group(), {})[
+          breakpoint.id()] = breakpoint
+
+  def _unindex_breakpoint(self, breakpoint):
+    """Removes a breakpoint from the lookup tables.
+
+    Args:
+      breakpoint: Breakpoint.
+    """
+    if breakpoint.type() == 'location':
+      (uri, line, column) = breakpoint.location()
+      del self._breakpoints_by_location[breakpoint.location()]
+      keys = self._breakpoint_keys_by_uri[uri]
+      del keys[bisect.bisect_left(keys, (line, column, breakpoint.id()))]
+      if not keys:
+        del self._breakpoint_keys_by_uri[uri]
+    elif breakpoint.type() == 'function':
+      del self._breakpoints_by_function[breakpoint.function_name()]
+    if breakpoint.group():
+      self._remove_from_group(breakpoint, breakpoint.group())
+    del self._breakpoints[breakpoint.id()]
+
+  def _remove_from_group(self, breakpoint, group):
+    """Removes a breakpoint from the group index.
+
+    Args:
+      breakpoint: Breakpoint.
+      group: Group name the breakpoint is indexed under.
+    """
+    group_breakpoints = self._breakpoints_by_group[group]
+    del group_breakpoints[breakpoint.id()]
+    if not len(group_breakpoints):
+      del self._breakpoints_by_group[group]
+
+  def _change_breakpoint_group(self, breakpoint, old_group):
+    """Updates the group index after a breakpoint changed group.
+
+    Args:
+      breakpoint: Breakpoint, already in its new group.
+      old_group: Previous group name, if any.
+    """
+    if not breakpoint.id() in self._breakpoints:
+      return
+    if old_group:
+      self._remove_from_group(breakpoint, old_group)
+    if breakpoint.group():
+      self._breakpoints_by_group.setdefault(breakpoint.group(), {})[
+          breakpoint.id()] = breakpoint
+
+  def _add_breakpoint(self, breakpoint):
+    """Adds a breakpoint.
+    The breakpoint must already be initialized.
+
+    Args:
+      breakpoint: Breakpoint to add.
+    """
+    self._index_breakpoint(breakpoint)
+    self._append_record({
+        'op': 'add',
+        'breakpoint': self._serialize_breakpoint(breakpoint),
+        })
+    if self._change_set:
+      self._change_set._add(breakpoint)
+    else:
+      self._listener.on_breakpoint_add(breakpoint)
 
   def create_breakpoint_at_location(self, location):
     """Creates a new breakpoint for a location.
@@ -186,6 +560,106 @@ class BreakpointList(object):
     """
     return self._breakpoints_by_location.get(location, None)
 
+  def get_breakpoint(self, breakpoint_id):
+    """Gets a breakpoint by ID.
+
+    Args:
+      breakpoint_id: Breakpoint ID.
+
+    Returns:
+      The Breakpoint with the given ID, if it exists.
+    """
+    return self._breakpoints.get(breakpoint_id, None)
+
+  def groups(self):
+    """Gets the names of all breakpoint groups.
+
+    Returns:
+      A sorted list of group names.
+    """
+    return sorted(self._breakpoints_by_group.keys())
+
+  def get_breakpoints_in_group(self, group):
+    """Gets all breakpoints in a group.
+
+    Args:
+      group: Group name.
+
+    Returns:
+      A list of Breakpoints.
+    """
+    return self._breakpoints_by_group.get(group, {}).values()
+
+  def set_breakpoints_enabled(self, breakpoints, enabled):
+    """Enables or disables a list of breakpoints in a single batch.
+    Debuggers receive all of the changes at once.
+
+    Args:
+      breakpoints: A list of Breakpoints.
+      enabled: True to enable the breakpoints.
+    """
+    with self.batch():
+      for breakpoint in breakpoints:
+        breakpoint.set_enabled(enabled)
+
+  def set_group_enabled(self, group, enabled):
+    """Enables or disables all breakpoints in a group.
+
+    Args:
+      group: Group name.
+      enabled: True to enable the breakpoints.
+    """
+    self.set_breakpoints_enabled(self.get_breakpoints_in_group(group), enabled)
+
+  def set_all_enabled(self, enabled):
+    """Enables or disables all breakpoints.
+
+    Args:
+      enabled: True to enable the breakpoints.
+    """
+    self.set_breakpoints_enabled(self._breakpoints.values(), enabled)
+
+  def get_breakpoints_in_file(self, uri):
+    """Gets all location breakpoints in the given file.
+
+    Args:
+      uri: File URI.
+
+    Returns:
+      A list of Breakpoints sorted by line and column.
+    """
+    keys = self._breakpoint_keys_by_uri.get(uri, [])
+    return [self._breakpoints[key[2]] for key in keys]
+
+  def has_breakpoints_in_file(self, uri):
+    """Checks whether a file has any location breakpoints.
+
+    Args:
+      uri: File URI.
+
+    Returns:
+      True if the file has breakpoints.
+    """
+    return uri in self._breakpoint_keys_by_uri
+
+  def get_breakpoints_in_range(self, uri, first_line, last_line):
+    """Gets all location breakpoints in a range of lines of a file.
+
+    Args:
+      uri: File URI.
+      first_line: First line, inclusive.
+      last_line: Last line, inclusive.
+
+    Returns:
+      A list of Breakpoints sorted by line and column.
+    """
+    keys = self._breakpoint_keys_by_uri.get(uri, None)
+    if not keys:
+      return []
+    start = bisect.bisect_left(keys, (first_line,))
+    end = bisect.bisect_left(keys, (last_line + 1,), start)
+    return [self._breakpoints[key[2]] for key in keys[start:end]]
+
   def create_breakpoint_for_function(self, function_name):
     """Creates a new breakpoint for a function call.
 
@@ -222,24 +696,72 @@ class BreakpointList(object):
     """
     if not breakpoint.id() in self._breakpoints:
       return
-    if breakpoint.type() == 'location':
-      del self._breakpoints_by_location[breakpoint.location()]
-    elif breakpoint.type() == 'function':
-      del self._breakpoints_by_function[breakpoint.function_name()]
-    del self._breakpoints[breakpoint.id()]
-    self._invalidate()
-    self._listener.on_breakpoint_remove(breakpoint)
+    self._unindex_breakpoint(breakpoint)
+    self._append_record({
+        'op': 'remove',
+        'id': breakpoint.id(),
+        })
+    if self._change_set:
+      self._change_set._remove(breakpoint)
+    else:
+      self._listener.on_breakpoint_remove(breakpoint)
+
+  def remove_breakpoints(self, breakpoints):
+    """Removes all of the given breakpoints in a single batch.
 
-  def _invalidate(self):
-    """Marks the list as needing a save.
-    The list will be saved at some point in the future.
+    Args:
+      breakpoints: A list of Breakpoints.
+    """
+    with self.batch():
+      for breakpoint in breakpoints:
+        self.remove_breakpoint(breakpoint)
+
+  def relocate_breakpoints(self, moves):
+    """Moves location breakpoints to new locations in a single update.
+    This is used when edits to a file shift the lines breakpoints are on.
+    Breakpoints that would land on the location of another breakpoint are
+    removed.
+
+    Args:
+      moves: A list of (Breakpoint, (uri, line, column)) tuples.
     """
-    self._is_dirty = True
-    if not self._save_pending:
-      # Queue a save for the next tick - this prevents excessive saving when
-      # heavily manipulating breakpoints
-      self._save_pending = True
-      sublime.set_timeout(lambda: self.save(), 0)
+    # Decide the collisions before changing anything. Breakpoints can shift
+    # onto each others old lines, so only those that stay put or have already
+    # been placed are in the way.
+    moving_ids = set()
+    for (breakpoint, location) in moves:
+      moving_ids.add(breakpoint.id())
+    claimed_locations = set()
+    for (location, breakpoint) in self._breakpoints_by_location.items():
+      if breakpoint.id() not in moving_ids:
+        claimed_locations.add(location)
+    moved = []
+    collided_breakpoints = []
+    for (breakpoint, location) in moves:
+      location = tuple(location)
+      if location in claimed_locations:
+        collided_breakpoints.append(breakpoint)
+      else:
+        claimed_locations.add(location)
+        moved.append((breakpoint, location))
+
+    with self.batch():
+      for (breakpoint, location) in moves:
+        self._unindex_breakpoint(breakpoint)
+      for (breakpoint, location) in moved:
+        breakpoint._location = location
+        self._index_breakpoint(breakpoint)
+        self._append_record({
+            'op': 'change',
+            'breakpoint': self._serialize_breakpoint(breakpoint),
+            })
+        self._change_set._move(breakpoint)
+      for breakpoint in collided_breakpoints:
+        self._append_record({
+            'op': 'remove',
+            'id': breakpoint.id(),
+            })
+        self._change_set._remove(breakpoint)
 
   def invalidate_breakpoint(self, breakpoint):
     """Invalidates the given breakpoint.
@@ -248,9 +770,14 @@ class BreakpointList(object):
     Args:
       breakpoint: Breakpoint that has changed.
     """
-    self._invalidate()
-    self._listener.on_breakpoint_change(breakpoint)
-    print 'TODO: invalidate breakpoint'
+    self._append_record({
+        'op': 'change',
+        'breakpoint': self._serialize_breakpoint(breakpoint),
+        })
+    if self._change_set:
+      self._change_set._change(breakpoint)
+    else:
+      self._listener.on_breakpoint_change(breakpoint)
 
 
 class Breakpoint(object):
@@ -284,6 +811,7 @@ class Breakpoint(object):
     self._display_name = None
     self._is_enabled = True
     self._condition = None
+    self._group = None
 
   def id(self):
     return self._id
@@ -327,3 +855,14 @@ class Breakpoint(object):
       return
     self._condition = value
     self._breakpoint_list.invalidate_breakpoint(self)
+
+  def group(self):
+    return self._group
+
+  def set_group(self, value):
+    if self._group == value:
+      return
+    old_group = self._group
+    self._group = value
+    self._breakpoint_list._change_breakpoint_group(self, old_group)
+    self._breakpoint_list.invalidate_breakpoint(self)
@@ -3,12 +3,96 @@
 __author__ = 'benvanik@google.com (Ben Vanik)'
 
 
+from collections import deque
+import sublime
+import time
+
+from .paths import normalize_uri
+from .protocol import EvaluateResponse
+
+
 class State:
   ATTACHING = 0
   ATTACHED = 1
   DETACHED = 2
 
 
+class ExceptionBreakMode:
+  NONE = 'none'
+  UNCAUGHT = 'uncaught'
+  ALL = 'all'
+  # Mode of new breakpoint lists and debuggers
+  DEFAULT = UNCAUGHT
+
+
+class ExceptionThrottle(object):
+  """Rate limiter for exceptions repeatedly thrown from the same location.
+  Once a location has thrown more than the threshold number of exceptions
+  without a quiet period of at least the given window between them, further
+  exceptions from it are only counted. The debugger continues past them
+  without querying state or notifying the UI.
+  """
+  def __init__(self, threshold=3, window=1.0, *args, **kwargs):
+    """Initializes an exception throttle.
+
+    Args:
+      threshold: Number of exceptions from a single location that are reported
+                 before throttling begins.
+      window: Seconds a location must remain quiet before it is reset.
+    """
+    self._threshold = threshold
+    self._window = window
+    # Maps of location -> (last hit time, hit count)
+    self._hits = {}
+    # Maps of location -> number of suppressed exceptions
+    self._suppressed_counts = {}
+
+  def threshold(self):
+    return self._threshold
+
+  def window(self):
+    return self._window
+
+  def reset(self):
+    """Clears all hit and suppression counts.
+    """
+    self._hits = {}
+    self._suppressed_counts = {}
+
+  def suppressed_count(self, location):
+    """Gets the number of exceptions suppressed at a location.
+
+    Args:
+      location: (uri, line, column) location.
+
+    Returns:
+      The number of exceptions that were not reported.
+    """
+    return self._suppressed_counts.get(location, 0)
+
+  def should_suppress(self, location, now=None):
+    """Records an exception and checks whether it should be suppressed.
+
+    Args:
+      location: (uri, line, column) location the exception was thrown from.
+      now: Current time, in seconds. Omit to use the system clock.
+
+    Returns:
+      True if the exception should not be reported.
+    """
+    if now is None:
+      now = time.time()
+    (last_time, count) = self._hits.get(location, (now, 0))
+    if now - last_time > self._window:
+      count = 0
+    count += 1
+    self._hits[location] = (now, count)
+    if count <= self._threshold:
+      return False
+    self._suppressed_counts[location] = self.suppressed_count(location) + 1
+    return True
+
+
 class Snapshot(object):
   """Debug state snapshot.
   """
@@ -49,6 +133,22 @@ class DebuggerListener(object):
     """
     pass
 
+  def on_breakpoint_resolve(self, breakpoint, location, *args, **kwargs):
+    """Handles the target binding a location breakpoint.
+
+    Args:
+      breakpoint: Breakpoint that was bound.
+      location: (uri, line, column) location the breakpoint was bound to, which
+                may differ from the breakpoint location, or None if the
+                breakpoint did not resolve to any code.
+    """
+    pass
+
+  def on_breakpoints_ready(self, *args, **kwargs):
+    """Handles all breakpoints of a sync being bound in the target.
+    """
+    pass
+
   def on_detach(self, reason, *args, **kwargs):
     """Handles the debugger detaching from the instance.
 
@@ -96,6 +196,16 @@ class DebuggerListener(object):
     """
     pass
 
+  def on_exception_throttled(self, location, *args, **kwargs):
+    """Handles a location being throttled for throwing too many exceptions.
+    This is only fired for the first suppressed exception from a location.
+    Query the debugger's ExceptionThrottle for running counts.
+
+    Args:
+      location: (uri, line, column) the exceptions are thrown from.
+    """
+    pass
+
 
 class Debugger(object):
   """Stateful instance debugger.
@@ -114,20 +224,49 @@ class Debugger(object):
     self._protocol.set_detach_callback(self._on_detach)
     self._protocol.set_break_callback(self._on_break)
     self._protocol.set_exception_callback(self._on_exception)
+    self._protocol.set_script_compile_callback(self._on_script_compile)
     self._listener = listener
     self._listener._debugger = self
     self._target_window = None
+    # SourceMapCache used to translate locations, if any
+    self._source_map_cache = None
+    # PathMapper used to map local paths to target URIs, if any
+    self._path_mapper = None
 
     # Maps of Breakpoint.id() -> protocol IDs and vs.
     self._breakpoint_to_protocol = {}
     self._protocol_to_breakpoint = {}
-    # A queue of pending breakpoint commands as (type, breakpoint)
-    # The queue is used to make change/removes wait until adds have completed
-    # and an ID mapping exists
-    self._breakpoint_queue = []
+    # Queues of pending breakpoint commands as (breakpoint, type, args), by
+    # Breakpoint.id()
+    # Commands are flushed on the next tick so that redundant ones can be
+    # collapsed, and change/removes wait until their add has completed and an
+    # ID mapping exists without holding up other breakpoints
+    self._breakpoint_queues = {}
+    self._breakpoint_flush_pending = False
+    # True while the breakpoints in the target are being queried for a sync,
+    # during which queued commands are held
+    self._is_syncing = False
+    # IDs of breakpoints with an add in flight
+    self._adding_breakpoint_ids = set()
+    # Location breakpoints that did not bind because their script has not been
+    # compiled yet, as dicts of Breakpoint.id() -> Breakpoint by normalized
+    # target script URI
+    self._pending_breakpoints = {}
+    self._pending_breakpoint_paths = {}
+    # Locations location breakpoints were bound to, by Breakpoint.id(), or
+    # None if they did not resolve to any code
+    self._resolved_locations = {}
+    # True once all breakpoints from the last sync are bound in the target
+    self._breakpoints_ready = False
+
+    # Replaced by the mode of the breakpoint list before attaching
+    self._exception_break_mode = ExceptionBreakMode.DEFAULT
+    self._exception_throttle = ExceptionThrottle()
 
     self._state = State.ATTACHING
     self._is_running = False
+    # Incremented each time the target pauses, used to invalidate caches
+    self._pause_epoch = 0
 
   def provider(self):
     return self._instance_info.provider()
@@ -138,18 +277,36 @@ class Debugger(object):
   def protocol(self):
     return self._protocol
 
+  def listener(self):
+    return self._listener
+
   def target_window(self):
     return self._target_window
 
   def set_target_window(self, value):
     self._target_window = value
 
+  def source_map_cache(self):
+    return self._source_map_cache
+
+  def set_source_map_cache(self, value):
+    self._source_map_cache = value
+
+  def path_mapper(self):
+    return self._path_mapper
+
+  def set_path_mapper(self, value):
+    self._path_mapper = value
+
   def state(self):
     return self._state
 
   def is_running(self):
     return self._is_running
 
+  def pause_epoch(self):
+    return self._pause_epoch
+
   def _set_is_running(self, value):
     if self._is_running != value:
       self._is_running = value
@@ -179,7 +336,26 @@ class Debugger(object):
     """Handles protocol attach callbacks.
     """
     self._state = State.ATTACHED
+    self._exception_throttle.reset()
     self._set_is_running(True)
+    self._send_exception_break_mode()
+    if self._source_map_cache:
+      # Discover the source maps of all loaded scripts first so that
+      # breakpoints added by the listener can be translated
+      self._protocol.query_scripts(self._on_attach_query_scripts)
+    else:
+      self._listener.on_attach()
+
+  def _on_attach_query_scripts(self, response, *args, **kwargs):
+    """Handles the script list queried while attaching.
+
+    Args:
+      response: QueryScriptsResponse.
+    """
+    if response.is_success():
+      # Breakpoints held for scripts that are now mapped can bind
+      self._add_pending_breakpoints(
+          self._source_map_cache.register_scripts(response.uris()))
     self._listener.on_attach()
 
   def detach(self, terminate=True):
@@ -202,9 +378,18 @@ class Debugger(object):
 
   def _pre_event(self, event, callback, *args, **kwargs):
     def _on_query_state(response):
+      self._pause_epoch += 1
       self._set_is_running(False)
       location = (event.source_url(), event.source_line(),
                   event.source_column())
+      frames = response.frames()
+      if self._source_map_cache:
+        # Map the break location and all frames in one pass
+        original_locations = self._source_map_cache.get_original_locations(
+            [location] + [frame.location() for frame in frames])
+        location = original_locations[0]
+        for n in range(len(frames)):
+          frames[n].set_location(original_locations[n + 1])
       snapshot = Snapshot(location,
                           response.handle_set(),
                           response.frames())
@@ -236,11 +421,124 @@ class Debugger(object):
       event: ExceptionEvent from protocol.
     """
     print 'DEBUGGER: exception event'
+    # Uncaught exceptions are always reported - they are likely to be fatal
+    location = (event.source_url(), event.source_line(),
+                event.source_column())
+    if (not event.is_uncaught() and
+        self._exception_throttle.should_suppress(location)):
+      # Continue without querying state or telling the UI
+      self._protocol.resume(self._update_state)
+      if self._exception_throttle.suppressed_count(location) == 1:
+        self._listener.on_exception_throttled(location)
+      return
     def _handle_event(location):
       self._listener.on_exception(location, event.is_uncaught(),
                                   event.exception())
     self._pre_event(event, _handle_event, *args, **kwargs)
 
+  def _on_script_compile(self, event, *args, **kwargs):
+    """Handles protocol script compile callbacks.
+    Breakpoints waiting on the script are added again so that they bind.
+
+    Args:
+      event: ScriptCompileEvent from protocol.
+    """
+    if self._source_map_cache:
+      self._source_map_cache.register_scripts([event.uri()])
+    self._add_pending_breakpoints([event.uri()])
+
+  def _add_pending_breakpoints(self, uris):
+    """Adds the pending breakpoints of the given scripts again.
+    Pending breakpoints are translated again first, as breakpoints in original
+    sources were deferred under their source path and only translate into
+    their generated script once its source map is known.
+
+    Args:
+      uris: A list of target script URIs.
+    """
+    if not self._pending_breakpoints:
+      return
+    paths = set([normalize_uri(uri) for uri in uris])
+    pending_breakpoints = []
+    for breakpoints in self._pending_breakpoints.values():
+      pending_breakpoints.extend(breakpoints.values())
+    locations = self._translate_breakpoint_locations(pending_breakpoints)
+    breakpoints = []
+    for n in range(len(pending_breakpoints)):
+      breakpoint = pending_breakpoints[n]
+      if (self._pending_breakpoint_paths[breakpoint.id()] in paths or
+          normalize_uri(locations[n][0]) in paths):
+        breakpoints.append(breakpoint)
+    if not breakpoints:
+      return
+    print 'DEBUGGER: adding %s pending breakpoints for %s' % (
+        len(breakpoints), ', '.join(uris))
+    for breakpoint in breakpoints:
+      self._undefer_breakpoint(breakpoint)
+      # Breakpoints being removed are not wanted any more, and any add after
+      # the remove will bind on its own
+      if self._has_queued_remove(breakpoint.id()):
+        continue
+      # Replace any breakpoint that bound to nothing
+      if breakpoint.id() in self._breakpoint_to_protocol:
+        self._queue_breakpoint_command(breakpoint, 'remove')
+      self._queue_breakpoint_command(breakpoint, 'add')
+
+  def _defer_breakpoint(self, breakpoint, uri):
+    """Holds a breakpoint until its script is compiled.
+
+    Args:
+      breakpoint: Location Breakpoint that did not bind.
+      uri: Target script URI the breakpoint was set in.
+    """
+    path = normalize_uri(uri)
+    self._pending_breakpoints.setdefault(path, {})[breakpoint.id()] = (
+        breakpoint)
+    self._pending_breakpoint_paths[breakpoint.id()] = path
+
+  def _has_queued_add(self, breakpoint_id):
+    """Checks whether the next queued command of a breakpoint is an add.
+
+    Args:
+      breakpoint_id: Breakpoint ID.
+
+    Returns:
+      True if an add is waiting to be sent.
+    """
+    queue = self._breakpoint_queues.get(breakpoint_id, None)
+    return not not queue and queue[0][1] == 'add'
+
+  def _has_queued_remove(self, breakpoint_id):
+    """Checks whether a remove is queued for a breakpoint.
+
+    Args:
+      breakpoint_id: Breakpoint ID.
+
+    Returns:
+      True if a remove is waiting to be sent.
+    """
+    queue = self._breakpoint_queues.get(breakpoint_id, None)
+    if not queue:
+      return False
+    for (breakpoint, command, args) in queue:
+      if command == 'remove':
+        return True
+    return False
+
+  def _undefer_breakpoint(self, breakpoint):
+    """Stops holding a breakpoint for its script, if it was.
+
+    Args:
+      breakpoint: Breakpoint.
+    """
+    path = self._pending_breakpoint_paths.pop(breakpoint.id(), None)
+    if not path:
+      return
+    pending_breakpoints = self._pending_breakpoints[path]
+    del pending_breakpoints[breakpoint.id()]
+    if not len(pending_breakpoints):
+      del self._pending_breakpoints[path]
+
   def suspend(self):
     if not self._is_running:
       return
@@ -306,11 +604,70 @@ class Debugger(object):
   def can_continue_to(self):
     return True
 
-  def evaluate(self):
-    pass
+  def evaluate(self, expression, callback, frame=None, disable_break=True):
+    """Evaluates an expression in the target.
+    Only valid while the target is paused.
+
+    Args:
+      expression: Expression source.
+      callback: A function to call with the EvaluateResponse.
+      frame: Frame to evaluate in, or None to evaluate in the global scope.
+      disable_break: True to disable breakpoints while evaluating.
+
+    Returns:
+      A request ID that can be passed to cancel_request, or None if the target
+      is running.
+    """
+    if self._is_running:
+      return None
+    print 'DEBUGGER: evaluate'
+    return self._protocol.evaluate(expression, frame, disable_break, callback)
+
+  def cancel_request(self, request_id):
+    """Cancels a pending request so that its callback is never called.
+
+    Args:
+      request_id: Request ID returned from a request method.
+    """
+    self._protocol.cancel_request(request_id)
+
+  def evaluate_all(self, expressions, callback, frame=None):
+    """Evaluates a list of expressions in one pipelined burst.
+    All requests are sent before any response is waited on, so the cost is a
+    single round trip regardless of the number of expressions. Breakpoints are
+    disabled during evaluation.
+
+    Args:
+      expressions: A list of expression sources.
+      callback: A function to call with a list of EvaluateResponses, in the
+                same order as the expressions, once all have completed. If the
+                target is running it is called immediately with failed
+                responses.
+      frame: Frame to evaluate in, or None to evaluate in the global scope.
+    """
+    if self._is_running:
+      callback([EvaluateResponse(self._protocol, True, False,
+                                 'target is running', None, None, None)
+                for expression in expressions])
+      return
+    print 'DEBUGGER: evaluate %s expressions' % (len(expressions))
+    responses = [None] * len(expressions)
+    remaining = [len(expressions)]
+    if not remaining[0]:
+      callback(responses)
+      return
+    def _make_callback(n):
+      def _on_evaluate(response):
+        responses[n] = response
+        remaining[0] -= 1
+        if not remaining[0]:
+          callback(responses)
+      return _on_evaluate
+    for n in range(len(expressions)):
+      self._protocol.evaluate(expressions[n], frame, True, _make_callback(n))
 
   def can_evaluate(self):
-    return True
+    return not self._is_running
 
   def query_values(self, handle_ids, callback):
     if self._is_running:
@@ -326,6 +683,41 @@ class Debugger(object):
     self._protocol.query_frame_scopes(frame, lambda response: callback(
         response.handle_set(), response.scopes()))
 
+  def exception_break_mode(self):
+    return self._exception_break_mode
+
+  def set_exception_break_mode(self, value):
+    """Sets which exceptions cause the target to break.
+
+    Args:
+      value: An ExceptionBreakMode value.
+    """
+    if self._exception_break_mode == value:
+      return
+    self._exception_break_mode = value
+    if self.is_attached():
+      self._send_exception_break_mode()
+
+  def _send_exception_break_mode(self):
+    """Sends the current exception break mode to the target.
+    Both flags are always sent so that no state is inherited from a previous
+    session.
+    """
+    mode = self._exception_break_mode
+    self._protocol.set_exception_break(
+        'all', mode == ExceptionBreakMode.ALL,
+        self._on_set_exception_break)
+    self._protocol.set_exception_break(
+        'uncaught', mode != ExceptionBreakMode.NONE,
+        self._on_set_exception_break)
+
+  def _on_set_exception_break(self, response, *args, **kwargs):
+    print 'DEBUGGER: set exception break'
+    self._update_state(response)
+
+  def exception_throttle(self):
+    return self._exception_throttle
+
   def force_gc(self):
     pass
 
@@ -345,22 +737,286 @@ class Debugger(object):
     if response.step_in_required():
       self.step_in()
 
+  def _translate_breakpoint_locations(self, breakpoints):
+    """Translates the locations of breakpoints into their generated scripts.
+    Breakpoints are stored in original source coordinates and local paths.
+    All locations are translated together so that each source map is decoded
+    at most once. Locations that are not source mapped have their local paths
+    mapped to target URIs.
+
+    Args:
+      breakpoints: A list of Breakpoints.
+
+    Returns:
+      A list of (uri, line, column) target locations, or None for
+      non-location breakpoints, in the same order as the breakpoints.
+    """
+    original_locations = []
+    for breakpoint in breakpoints:
+      if breakpoint.type() == 'location':
+        original_locations.append(breakpoint.location())
+    locations = original_locations
+    if self._source_map_cache and len(locations):
+      locations = self._source_map_cache.get_generated_locations(locations)
+    if self._path_mapper:
+      for n in range(len(locations)):
+        (uri, line, column) = locations[n]
+        if uri == original_locations[n][0]:
+          locations[n] = (self._path_mapper.to_remote(uri), line, column)
+    results = []
+    n = 0
+    for breakpoint in breakpoints:
+      if breakpoint.type() == 'location':
+        results.append(locations[n])
+        n += 1
+      else:
+        results.append(None)
+    return results
+
+  def breakpoints_ready(self):
+    return self._breakpoints_ready
+
+  def resolved_locations(self):
+    """Gets the locations all location breakpoints were bound to.
+
+    Returns:
+      A dict of Breakpoint IDs to (uri, line, column) locations, or None for
+      breakpoints that did not resolve to any code.
+    """
+    return self._resolved_locations
+
+  def get_resolved_location(self, breakpoint):
+    """Gets the location a breakpoint was bound to.
+
+    Args:
+      breakpoint: Breakpoint.
+
+    Returns:
+      A (uri, line, column) location, or None if the breakpoint has not been
+      bound or did not resolve to any code.
+    """
+    return self._resolved_locations.get(breakpoint.id(), None)
+
+  def _resolve_breakpoint(self, breakpoint, actual_locations):
+    """Records the location a breakpoint was bound to.
+
+    Args:
+      breakpoint: Breakpoint.
+      actual_locations: A list of (uri, line, column) target locations from
+                        the add response.
+    """
+    if breakpoint.type() != 'location':
+      return
+    location = None
+    if len(actual_locations):
+      location = actual_locations[0]
+      if self._source_map_cache:
+        location = self._source_map_cache.get_original_location(location)
+      if location[0] == actual_locations[0][0]:
+        # Not source mapped, so in the same file as the breakpoint
+        location = (breakpoint.location()[0], location[1], location[2])
+    self._resolved_locations[breakpoint.id()] = location
+    self._listener.on_breakpoint_resolve(breakpoint, location)
+
+  def sync_breakpoints(self, breakpoints, reconcile=False, callback=None):
+    """Sends a complete set of breakpoints to the target.
+    All requests are sent at once instead of waiting on each other, and
+    completion is tracked for the whole set. Once every request has completed
+    the listener receives on_breakpoints_ready.
+
+    When reconciling, the breakpoints already in the target (such as those left
+    from a previous session with the same target) are queried first.
+    Breakpoints that match are adopted, those that differ are changed, missing
+    ones are added and any others are cleared. Commands queued while querying
+    are held and sent once the target has been reconciled.
+
+    Args:
+      breakpoints: A list of all Breakpoints.
+      reconcile: True to reconcile against breakpoints already in the target.
+      callback: A function to call once all breakpoints are bound.
+    """
+    print 'DEBUGGER: sync breakpoints'
+    self._breakpoints_ready = False
+    if not reconcile:
+      self._reconcile_breakpoints(breakpoints, [], callback)
+      return
+    self._is_syncing = True
+    def _on_query_breakpoints(response, *args, **kwargs):
+      self._is_syncing = False
+      target_breakpoints = []
+      if response.is_success():
+        target_breakpoints = response.breakpoints()
+      self._reconcile_breakpoints(breakpoints, target_breakpoints, callback)
+    self._protocol.query_breakpoints(_on_query_breakpoints)
+
+  def _reconcile_breakpoints(self, breakpoints, target_breakpoints, callback):
+    """Sends the requests needed to make the target match a set of breakpoints.
+
+    Args:
+      breakpoints: A list of all Breakpoints.
+      target_breakpoints: A list of TargetBreakpoints already in the target.
+      callback: A function to call once all requests have completed.
+    """
+    # Location breakpoints are matched by location and function breakpoints by
+    # function name; any that can't be matched are cleared
+    target_breakpoints_by_key = {}
+    removed_protocol_ids = []
+    for target_breakpoint in target_breakpoints:
+      if target_breakpoint.type() == 'location':
+        key = ('location', target_breakpoint.location())
+      elif target_breakpoint.function_name():
+        key = ('function', target_breakpoint.function_name())
+      else:
+        removed_protocol_ids.append(target_breakpoint.protocol_id())
+        continue
+      target_breakpoints_by_key[key] = target_breakpoint
+
+    # Requests that have not yet completed, in a list so that the closure can
+    # modify it
+    pending_count = [0]
+    def _on_complete(response, *args, **kwargs):
+      pending_count[0] -= 1
+      if not pending_count[0]:
+        self._on_breakpoints_ready(callback)
+
+    changed_breakpoints = []
+    added_breakpoints = []
+    added_locations = []
+    # Breakpoints with an add queued since the sync started are left to it
+    breakpoints = [breakpoint for breakpoint in breakpoints
+                   if not self._has_queued_add(breakpoint.id())]
+    locations = self._translate_breakpoint_locations(breakpoints)
+    for n in range(len(breakpoints)):
+      breakpoint = breakpoints[n]
+      if breakpoint.type() == 'location':
+        key = ('location', locations[n])
+      else:
+        key = ('function', breakpoint.function_name())
+      target_breakpoint = target_breakpoints_by_key.pop(key, None)
+      if not target_breakpoint:
+        # Removed since the sync started, so there is nothing to add; the
+        # queued remove is dropped as the breakpoint is not in the target
+        if not self._has_queued_remove(breakpoint.id()):
+          added_breakpoints.append(breakpoint)
+          added_locations.append(locations[n])
+        continue
+      # Adopt the existing breakpoint
+      protocol_id = target_breakpoint.protocol_id()
+      self._breakpoint_to_protocol[breakpoint.id()] = protocol_id
+      self._protocol_to_breakpoint[protocol_id] = breakpoint
+      self._resolve_breakpoint(breakpoint, target_breakpoint.actual_locations())
+      if (target_breakpoint.is_enabled() != breakpoint.is_enabled() or
+          (target_breakpoint.condition() or None) != breakpoint.condition()):
+        changed_breakpoints.append(breakpoint)
+        # The change sends the latest state, making queued ones redundant
+        queue = self._breakpoint_queues.get(breakpoint.id(), None)
+        if queue:
+          for entry in [entry for entry in queue if entry[1] == 'change']:
+            queue.remove(entry)
+          if not len(queue):
+            del self._breakpoint_queues[breakpoint.id()]
+    # Anything left in the target is not in the list
+    for target_breakpoint in target_breakpoints_by_key.values():
+      removed_protocol_ids.append(target_breakpoint.protocol_id())
+
+    # Commands queued while querying can now go out: those for adopted
+    # breakpoints are sent next tick, and those for added breakpoints wait for
+    # their adds
+    self._schedule_breakpoint_flush()
+
+    pending_count[0] = (len(changed_breakpoints) + len(added_breakpoints) +
+                        len(removed_protocol_ids))
+    if not pending_count[0]:
+      self._on_breakpoints_ready(callback)
+      return
+    for breakpoint in changed_breakpoints:
+      self._protocol.change_breakpoint(
+          self._breakpoint_to_protocol[breakpoint.id()], breakpoint,
+          _on_complete)
+    for n in range(len(added_breakpoints)):
+      self._send_add_breakpoint(added_breakpoints[n], added_locations[n],
+                                callback=_on_complete)
+    for protocol_id in removed_protocol_ids:
+      self._protocol.remove_breakpoint(protocol_id, _on_complete)
+
+  def _on_breakpoints_ready(self, callback):
+    """Handles the completion of a breakpoint sync.
+
+    Args:
+      callback: A function to call, if any.
+    """
+    print 'DEBUGGER: breakpoints ready'
+    self._breakpoints_ready = True
+    self._listener.on_breakpoints_ready()
+    if callback:
+      callback()
+
   def add_breakpoint(self, breakpoint):
     """Adds a breakpoint to the debugger.
 
     Args:
       breakpoint: Breakpoint to add.
     """
+    self.add_breakpoints([breakpoint])
+
+  def add_breakpoints(self, breakpoints):
+    """Adds a list of breakpoints to the debugger.
+    Adds are sent together on the next tick, so locations are translated in
+    bulk. This is much faster than adding each breakpoint individually when
+    source maps are in use.
+
+    Args:
+      breakpoints: A list of Breakpoints to add.
+    """
+    print 'DEBUGGER: add breakpoints'
+    for breakpoint in breakpoints:
+      self._queue_breakpoint_command(breakpoint, 'add')
+
+  def _send_add_breakpoint(self, breakpoint, location, callback=None):
+    """Sends a breakpoint add request.
+    Commands queued for the breakpoint wait until the add completes. If it
+    fails they are dropped.
+
+    Args:
+      breakpoint: Breakpoint to add.
+      location: Translated (uri, line, column) target location, if a location
+                breakpoint.
+      callback: A function to call with the response once the add completes.
+    """
     print 'DEBUGGER: add breakpoint'
+    breakpoint_id = breakpoint.id()
+    self._adding_breakpoint_ids.add(breakpoint_id)
     def _on_add_breakpoint(response, *args, **kwargs):
-      # TODO(benvanik): update actual location
-      breakpoint_id = breakpoint.id()
+      self._adding_breakpoint_ids.discard(breakpoint_id)
+      defer = False
       protocol_id = response.protocol_id()
-      self._breakpoint_to_protocol[breakpoint_id] = protocol_id
-      self._protocol_to_breakpoint[protocol_id] = breakpoint
-      self._pump_breakpoint_queue()
+      if response.is_success() and protocol_id is not None:
+        self._breakpoint_to_protocol[breakpoint_id] = protocol_id
+        self._protocol_to_breakpoint[protocol_id] = breakpoint
+        self._resolve_breakpoint(breakpoint, response.actual_locations())
+        if location and not len(response.actual_locations()):
+          # Most likely the script has not been loaded yet
+          defer = True
+      else:
+        print 'DEBUGGER: failed to add breakpoint %s: %s' % (
+            breakpoint_id, response.error_message())
+        defer = not not location
+      # Breakpoints removed while the add was in flight must not come back
+      if defer and not self._has_queued_remove(breakpoint_id):
+        if self._translate_breakpoint_locations([breakpoint])[0] != location:
+          # The source map of its script was loaded while the add was in
+          # flight, so it can bind now
+          if breakpoint_id in self._breakpoint_to_protocol:
+            self._queue_breakpoint_command(breakpoint, 'remove')
+          self._queue_breakpoint_command(breakpoint, 'add')
+        else:
+          self._defer_breakpoint(breakpoint, location[0])
+      if self._pump_breakpoint_queue(breakpoint_id):
+        self._schedule_breakpoint_flush()
       self._update_state(response)
-    self._protocol.add_breakpoint(breakpoint, _on_add_breakpoint)
+      if callback:
+        callback(response)
+    self._protocol.add_breakpoint(breakpoint, location, _on_add_breakpoint)
 
   def change_breakpoint(self, breakpoint):
     """Updates a breakpoint that has changed.
@@ -369,8 +1025,7 @@ class Debugger(object):
       breakpoint: Breakpoint that changed.
     """
     print 'DEBUGGER: change breakpoint'
-    self._breakpoint_queue.append(('change', breakpoint))
-    self._pump_breakpoint_queue()
+    self._queue_breakpoint_command(breakpoint, 'change')
 
   def _on_change_breakpoint(self, response, *args, **kwargs):
     print 'DEBUGGER: changed breakpoint'
@@ -384,8 +1039,7 @@ class Debugger(object):
       ignore_count: Number of hits to ignore.
     """
     print 'DEBUGGER: ignore breakpoint'
-    self._breakpoint_queue.append(('ignore', breakpoint, ignore_count))
-    self._pump_breakpoint_queue()
+    self._queue_breakpoint_command(breakpoint, 'ignore', ignore_count)
 
   def _on_ignore_breakpoint(self, response, *args, **kwargs):
     print 'DEBUGGER: ignored breakpoint'
@@ -398,35 +1052,154 @@ class Debugger(object):
       breakpoint: Breakpoint to remove.
     """
     print 'DEBUGGER: remove breakpoint'
-    self._breakpoint_queue.append(('remove', breakpoint))
-    self._pump_breakpoint_queue()
+    self._queue_breakpoint_command(breakpoint, 'remove')
+
+  def move_breakpoints(self, breakpoints):
+    """Updates breakpoints that have moved to new locations.
+    Protocols cannot change the location of a breakpoint, so each is removed
+    and added again at its new location.
+
+    Args:
+      breakpoints: A list of Breakpoints that moved.
+    """
+    print 'DEBUGGER: move breakpoints'
+    for breakpoint in breakpoints:
+      self._queue_breakpoint_command(breakpoint, 'remove')
+      self._queue_breakpoint_command(breakpoint, 'add')
+
+  def apply_breakpoint_changes(self, change_set):
+    """Applies a batch of breakpoint changes.
+    All commands are queued together and go out in one flush, with the
+    locations of all added and moved breakpoints translated in one pass.
+
+    Args:
+      change_set: BreakpointChangeSet from a breakpoint list batch.
+    """
+    print 'DEBUGGER: apply breakpoint changes'
+    for breakpoint in change_set.removed():
+      self._queue_breakpoint_command(breakpoint, 'remove')
+    for breakpoint in change_set.moved():
+      self._queue_breakpoint_command(breakpoint, 'remove')
+      self._queue_breakpoint_command(breakpoint, 'add')
+    for breakpoint in change_set.changed():
+      self._queue_breakpoint_command(breakpoint, 'change')
+    for breakpoint in change_set.added():
+      self._queue_breakpoint_command(breakpoint, 'add')
 
   def _on_remove_breakpoint(self, response, *args, **kwargs):
     print 'DEBUGGER: removed breakpoint'
     self._update_state(response)
 
-  def _pump_breakpoint_queue(self):
-    """Executes all breakpoint queue entries until the first without a mapping.
-    This should be called after every entry is added to ensure they are all
-    flushed.
+  def _queue_breakpoint_command(self, breakpoint, command, *args):
+    """Queues a breakpoint command to be sent on the next tick.
+    Redundant commands are collapsed: changes always send the latest state of
+    the breakpoint so consecutive changes (or a change after an unsent add) are
+    merged, and removing a breakpoint whose add has not been sent cancels the
+    add and everything after it.
+
+    Args:
+      breakpoint: Breakpoint.
+      command: 'add', 'change', 'ignore' or 'remove'.
+      args: Additional command arguments.
+    """
+    breakpoint_id = breakpoint.id()
+    queue = self._breakpoint_queues.get(breakpoint_id, None)
+    if queue is None:
+      queue = deque()
+      self._breakpoint_queues[breakpoint_id] = queue
+    if command == 'change':
+      if len(queue) and queue[-1][1] in ['add', 'change']:
+        return
+    elif command == 'remove':
+      # Anything queued before the remove is pointless now, back to an add or
+      # a previous remove
+      while len(queue) and not queue[-1][1] in ['add', 'remove']:
+        queue.pop()
+      if len(queue) and queue[-1][1] == 'add':
+        queue.pop()
+        if not len(queue):
+          del self._breakpoint_queues[breakpoint_id]
+          self._undefer_breakpoint(breakpoint)
+        return
+    queue.append((breakpoint, command, args))
+    self._schedule_breakpoint_flush()
+
+  def _schedule_breakpoint_flush(self):
+    """Schedules a flush of all breakpoint queues on the next tick.
+    """
+    if not self._breakpoint_flush_pending:
+      self._breakpoint_flush_pending = True
+      sublime.set_timeout(lambda: self._flush_breakpoint_queues(), 0)
+
+  def _flush_breakpoint_queues(self):
+    """Sends all breakpoint commands that can be sent.
     """
-    while len(self._breakpoint_queue):
-      entry = self._breakpoint_queue[0]
-      breakpoint = entry[1]
-      protocol_id = self._breakpoint_to_protocol.get(breakpoint.id(), None)
+    self._breakpoint_flush_pending = False
+    if self._is_syncing:
+      # Held until the target has been reconciled, as the breakpoints are not
+      # mapped to it yet
+      return
+    breakpoint_ids = self._breakpoint_queues.keys()
+    for breakpoint_id in breakpoint_ids:
+      self._pump_breakpoint_queue(breakpoint_id)
+
+    # Send all adds together so their locations are translated in one pass
+    added_breakpoints = []
+    for breakpoint_id in self._breakpoint_queues.keys():
+      if breakpoint_id in self._adding_breakpoint_ids:
+        continue
+      queue = self._breakpoint_queues[breakpoint_id]
+      (breakpoint, command, args) = queue.popleft()
+      added_breakpoints.append(breakpoint)
+      if not len(queue):
+        del self._breakpoint_queues[breakpoint_id]
+    if len(added_breakpoints):
+      locations = self._translate_breakpoint_locations(added_breakpoints)
+      for n in range(len(added_breakpoints)):
+        self._send_add_breakpoint(added_breakpoints[n], locations[n])
+
+  def _pump_breakpoint_queue(self, breakpoint_id):
+    """Sends the queued commands of a breakpoint.
+    Sending stops at an add or while an add is in flight. Commands for
+    breakpoints that are not in the target, such as when their add failed, are
+    dropped.
+
+    Args:
+      breakpoint_id: Breakpoint ID.
+
+    Returns:
+      True if commands remain queued for the breakpoint.
+    """
+    queue = self._breakpoint_queues.get(breakpoint_id, None)
+    if queue is None:
+      return False
+    while len(queue):
+      if breakpoint_id in self._adding_breakpoint_ids:
+        return True
+      (breakpoint, command, args) = queue[0]
+      if command == 'add':
+        return True
+      queue.popleft()
+      if command == 'remove':
+        # Only stop waiting for the script once the remove has gone out (or
+        # been dropped), so an add in flight cannot defer the breakpoint again
+        self._undefer_breakpoint(breakpoint)
+      protocol_id = self._breakpoint_to_protocol.get(breakpoint_id, None)
       if protocol_id == None:
-        break
-      if entry[0] == 'change':
+        print 'DEBUGGER: dropping %s of breakpoint %s not in target' % (
+            command, breakpoint_id)
+        continue
+      if command == 'change':
         self._protocol.change_breakpoint(protocol_id, breakpoint,
                                          self._on_change_breakpoint)
-      elif entry[0] == 'ignore':
-        self._protocol.ignore_breakpoint(protocol_id, entry[2],
+      elif command == 'ignore':
+        self._protocol.ignore_breakpoint(protocol_id, args[0],
                                          self._on_ignore_breakpoint)
-      elif entry[0] == 'remove':
+      elif command == 'remove':
         self._protocol.remove_breakpoint(protocol_id,
                                          self._on_remove_breakpoint)
-        del self._breakpoint_to_protocol[breakpoint.id()]
+        del self._breakpoint_to_protocol[breakpoint_id]
         del self._protocol_to_breakpoint[protocol_id]
-      self._breakpoint_queue.pop(0)
-
-  # TODO(benvanik): toggle all breakpoints
+        self._resolved_locations.pop(breakpoint_id, None)
+    del self._breakpoint_queues[breakpoint_id]
+    return False
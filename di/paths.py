@@ -0,0 +1,280 @@
+# Copyright 2012 Google Inc. All Rights Reserved.
+
+__author__ = 'benvanik@google.com (Ben Vanik)'
+
+
+import os
+import re
+import threading
+
+
+# Splits paths on both POSIX and Windows separators
+_SEPARATOR_RE = re.compile(r'[/\\]+')
+
+# Directories that are not searched for scripts, in addition to hidden ones
+# (.git/.svn/.hg/etc)
+_SKIPPED_DIRECTORIES = set([
+    'node_modules',
+    'bower_components',
+    'CVS',
+    '_darcs',
+    '__pycache__',
+    ])
+
+
+def _split_path(path):
+  """Splits a path into its segments.
+
+  Args:
+    path: Remote URI or local path.
+
+  Returns:
+    A list of path segments. Absolute paths start with an empty segment.
+  """
+  if path.startswith('file://'):
+    path = path[len('file://'):]
+  return _SEPARATOR_RE.split(path)
+
+
+def normalize_uri(uri):
+  """Normalizes a script URI or path for use as a lookup key.
+  Separators are unified so that URIs reported by the target compare equal to
+  the paths breakpoints were set with.
+
+  Args:
+    uri: Remote URI or local path.
+
+  Returns:
+    A normalized URI.
+  """
+  return '/'.join(_split_path(uri))
+
+
+class _PrefixTrie(object):
+  """A trie of path segments mapping path prefixes to replacement prefixes.
+  """
+  def __init__(self, *args, **kwargs):
+    # Child nodes, by segment
+    self._children = {}
+    # Replacement prefix if a rule ends at this node
+    self._target = None
+
+  def add(self, prefix, target):
+    """Adds a prefix rule.
+
+    Args:
+      prefix: Path prefix to match.
+      target: Path prefix to replace it with.
+    """
+    node = self
+    for segment in _split_path(prefix.rstrip('/\\')):
+      node = node._children.setdefault(segment, _PrefixTrie())
+    node._target = target
+
+  def translate(self, path):
+    """Replaces the longest matching prefix of a path.
+
+    Args:
+      path: Path to translate.
+
+    Returns:
+      The translated path, or None if no rule matches.
+    """
+    segments = _split_path(path)
+    node = self
+    match = None
+    for n in range(len(segments)):
+      node = node._children.get(segments[n], None)
+      if not node:
+        break
+      if node._target is not None:
+        match = (node._target, n + 1)
+    if not match:
+      return None
+    (target, count) = match
+    if count == len(segments):
+      return target
+    return os.path.join(target, *segments[count:])
+
+
+def _build_basename_index(search_paths):
+  """Indexes all files in the given directories by basename.
+  Hidden directories and those in _SKIPPED_DIRECTORIES are not descended into.
+
+  Args:
+    search_paths: A list of local directories.
+
+  Returns:
+    A dict of lists of local paths, by basename.
+  """
+  files_by_basename = {}
+  for search_path in search_paths:
+    for (dirpath, dirnames, filenames) in os.walk(search_path):
+      dirnames[:] = [name for name in dirnames
+                     if not name.startswith('.') and
+                     not name in _SKIPPED_DIRECTORIES]
+      for filename in filenames:
+        files_by_basename.setdefault(filename, []).append(
+            os.path.join(dirpath, filename))
+  return files_by_basename
+
+
+class _BasenameIndexThread(threading.Thread):
+  """Thread that indexes the search paths of a PathMapper.
+  Walking large project folders can take seconds, so it is kept off the UI
+  thread. The finished index is handed to the mapper in a single assignment.
+  """
+  def __init__(self, path_mapper, search_paths, *args, **kwargs):
+    """Initializes an index thread.
+
+    Args:
+      path_mapper: PathMapper that receives the index.
+      search_paths: A list of local directories to index.
+    """
+    super(_BasenameIndexThread, self).__init__(*args, **kwargs)
+    self._path_mapper = path_mapper
+    self._search_paths = search_paths
+
+  def run(self):
+    files_by_basename = _build_basename_index(self._search_paths)
+    self._path_mapper._files_by_basename = files_by_basename
+
+
+class PathMapper(object):
+  """Maps script URIs in the target to local paths and back.
+  Targets running in containers, on other machines, or from build output
+  directories see different paths than the editor. Mapping is done with
+  configurable prefix rules, and falls back to searching the given search paths
+  for a file with the same name and the longest matching path suffix.
+
+  Results are memoized in both directions, so repeated lookups (such as for
+  every frame on every pause) never touch the filesystem. The search paths are
+  indexed on a background thread, and files are not searched for until it has
+  finished.
+  """
+  def __init__(self, rules=None, search_paths=None, *args, **kwargs):
+    """Initializes a path mapper.
+
+    Args:
+      rules: A dict of remote path prefixes to local path prefixes.
+      search_paths: A list of local directories to search for files that are
+                    not matched by any rule, such as the project folders.
+    """
+    self._rules = dict(rules or {})
+    self._search_paths = list(search_paths or [])
+    self._local_trie = _PrefixTrie()
+    self._remote_trie = _PrefixTrie()
+    for (remote_prefix, local_prefix) in self._rules.items():
+      self._local_trie.add(remote_prefix, local_prefix)
+      self._remote_trie.add(local_prefix, remote_prefix)
+    # Local paths of every file in the search paths, by basename, set by the
+    # index thread when it finishes
+    self._files_by_basename = None
+    if self._search_paths:
+      _BasenameIndexThread(self, list(self._search_paths)).start()
+    # Memoized translations in each direction
+    self._local_paths = {}
+    self._remote_uris = {}
+
+  def rules(self):
+    return self._rules
+
+  def search_paths(self):
+    return self._search_paths
+
+  def is_equivalent(self, rules, search_paths):
+    """Checks whether the mapper was created with the given configuration.
+
+    Args:
+      rules: A dict of remote path prefixes to local path prefixes.
+      search_paths: A list of local directories.
+
+    Returns:
+      True if the configuration matches.
+    """
+    return (self._rules == dict(rules or {}) and
+            self._search_paths == list(search_paths or []))
+
+  def _search_local_path(self, uri):
+    """Searches the search paths for the file best matching a remote URI.
+    Candidates must have the same basename, and the one sharing the most
+    trailing path segments with the URI wins.
+
+    Args:
+      uri: Remote script URI.
+
+    Returns:
+      A local path, or None if no file matches or the search paths have not
+      been indexed yet.
+    """
+    files_by_basename = self._files_by_basename
+    if not files_by_basename:
+      return None
+    segments = _split_path(uri)
+    candidates = files_by_basename.get(segments[-1], None)
+    if not candidates:
+      return None
+    best_path = None
+    best_count = 0
+    for candidate in candidates:
+      candidate_segments = _split_path(candidate)
+      count = 0
+      while (count < len(segments) and count < len(candidate_segments) and
+             segments[-1 - count] == candidate_segments[-1 - count]):
+        count += 1
+      if count > best_count:
+        best_path = candidate
+        best_count = count
+    return best_path
+
+  def to_local(self, uri):
+    """Maps a remote script URI to a local path.
+
+    Args:
+      uri: Script URI in the target.
+
+    Returns:
+      A local path, or the URI unchanged if it cannot be mapped.
+    """
+    local_path = self._local_paths.get(uri, None)
+    if local_path is not None:
+      return local_path
+    local_path = self._local_trie.translate(uri)
+    if not local_path:
+      if uri.startswith('file://'):
+        local_path = uri[len('file://'):]
+      else:
+        local_path = uri
+      if not os.path.exists(local_path):
+        local_path = self._search_local_path(uri)
+        if not local_path:
+          if self._search_paths and self._files_by_basename is None:
+            # Not memoized, so it is searched for again once indexed
+            return uri
+          local_path = uri
+    self._local_paths[uri] = local_path
+    if local_path != uri:
+      self._remote_uris.setdefault(local_path, uri)
+    return local_path
+
+  def to_remote(self, path):
+    """Maps a local path to a remote script URI.
+
+    Args:
+      path: Local path.
+
+    Returns:
+      A script URI, or the path unchanged if it cannot be mapped.
+    """
+    uri = self._remote_uris.get(path, None)
+    if uri is not None:
+      return uri
+    uri = self._remote_trie.translate(path)
+    if not uri:
+      # Not memoized, so a URI found for the path by to_local is used once
+      # the target reports it
+      return path
+    # Rules always produce '/' separated URIs
+    uri = uri.replace('\\', '/')
+    self._remote_uris[path] = uri
+    return uri
@@ -3,6 +3,9 @@
 __author__ = 'benvanik@google.com (Ben Vanik)'
 
 
+import json
+
+
 class DebuggerProtocol(object):
   """An abstract debugger protocol.
   Protocols implement asynchronous command channels for controlling remote
@@ -20,6 +23,7 @@ class DebuggerProtocol(object):
     self._detach_callback = None
     self._break_callback = None
     self._exception_callback = None
+    self._script_compile_callback = None
 
   def uri(self):
     return self._uri
@@ -33,6 +37,9 @@ class DebuggerProtocol(object):
   def set_exception_callback(self, value):
     self._exception_callback = value
 
+  def set_script_compile_callback(self, value):
+    self._script_compile_callback = value
+
   def is_attached(self):
     """
     Returns:
@@ -98,11 +105,21 @@ class DebuggerProtocol(object):
     """
     raise NotImplementedError()
 
-  def add_breakpoint(self, breakpoint, callback):
+  def query_scripts(self, callback):
+    """Queries the scripts loaded in the target.
+
+    Args:
+      callback: A function to call when the query completes.
+    """
+    raise NotImplementedError()
+
+  def add_breakpoint(self, breakpoint, location, callback):
     """Adds a breakpoint to the debugger.
 
     Args:
       breakpoint: Breakpoint to add.
+      location: (uri, line, column) target location for location breakpoints,
+                translated to the script the target will execute.
       callback: A function to call when the add completes. Inspect for the
                 protocol ID used in change/remove requests.
     """
@@ -137,6 +154,54 @@ class DebuggerProtocol(object):
     """
     raise NotImplementedError()
 
+  def query_breakpoints(self, callback):
+    """Queries the location breakpoints currently set in the target.
+    Breakpoints may outlive a debugging session, such as when detaching from a
+    target without terminating it.
+
+    Args:
+      callback: A function to call when the query completes.
+    """
+    raise NotImplementedError()
+
+  def set_exception_break(self, break_type, enabled, callback):
+    """Enables or disables breaking on exceptions in the target.
+    Filtering happens in the target, so exceptions that do not match are never
+    reported to the debugger.
+
+    Args:
+      break_type: 'all' or 'uncaught'.
+      enabled: True to break on exceptions of the given type.
+      callback: A function to call when the change completes.
+    """
+    raise NotImplementedError()
+
+  def evaluate(self, expression, frame, disable_break, callback):
+    """Evaluates an expression in the target.
+    This is only valid while the remote debugger is paused after an event,
+    such as a break or exception.
+
+    Args:
+      expression: Expression source.
+      frame: Frame to evaluate in, or None to evaluate in the global scope.
+      disable_break: True to disable breakpoints while evaluating.
+      callback: A function to call when the evaluation completes.
+
+    Returns:
+      A request ID that can be passed to cancel_request.
+    """
+    raise NotImplementedError()
+
+  def cancel_request(self, request_id):
+    """Cancels a pending request.
+    The remote debugger may still process the request, but its callback will
+    not be called.
+
+    Args:
+      request_id: Request ID returned from the request method.
+    """
+    raise NotImplementedError()
+
   def query_values(self, handle_ids, callback):
     """Queries the values of a list of handles.
     This is only valid while the remote debugger is paused after an event,
@@ -221,6 +286,80 @@ class SnapshotResponse(ProtocolResponse):
     return self._frames
 
 
+class EvaluateResponse(ProtocolResponse):
+  """A response to expression evaluation requests.
+  """
+  def __init__(self, protocol, is_running, is_success, error_message, body,
+               handle_set, value, *args, **kwargs):
+    """Initializes an evaluate response.
+
+    Args:
+      protocol: The protocol that this response is from.
+      is_running: True if the VM is running.
+      is_success: True if the requests was successful.
+      error_message: An error message, if not successful.
+      body: Raw body. Implementation-specific.
+      handle_set: Handle value set.
+      value: Resulting value handle, if successful.
+    """
+    super(EvaluateResponse, self).__init__(
+        protocol, is_running, is_success, error_message, body, *args, **kwargs)
+    self._handle_set = handle_set
+    self._value = value
+
+  def handle_set(self):
+    return self._handle_set
+
+  def value(self):
+    return self._value
+
+
+class QueryScriptsResponse(ProtocolResponse):
+  """A response to script list requests.
+  """
+  def __init__(self, protocol, is_running, is_success, error_message, body,
+               uris, *args, **kwargs):
+    """Initializes a script query response.
+
+    Args:
+      protocol: The protocol that this response is from.
+      is_running: True if the VM is running.
+      is_success: True if the requests was successful.
+      error_message: An error message, if not successful.
+      body: Raw body. Implementation-specific.
+      uris: A list of script URIs.
+    """
+    super(QueryScriptsResponse, self).__init__(
+        protocol, is_running, is_success, error_message, body, *args, **kwargs)
+    self._uris = uris
+
+  def uris(self):
+    return self._uris
+
+
+class QueryBreakpointsResponse(ProtocolResponse):
+  """A response to breakpoint list requests.
+  """
+  def __init__(self, protocol, is_running, is_success, error_message, body,
+               breakpoints, *args, **kwargs):
+    """Initializes a breakpoint query response.
+
+    Args:
+      protocol: The protocol that this response is from.
+      is_running: True if the VM is running.
+      is_success: True if the requests was successful.
+      error_message: An error message, if not successful.
+      body: Raw body. Implementation-specific.
+      breakpoints: A list of TargetBreakpoints.
+    """
+    super(QueryBreakpointsResponse, self).__init__(
+        protocol, is_running, is_success, error_message, body, *args, **kwargs)
+    self._breakpoints = breakpoints
+
+  def breakpoints(self):
+    return self._breakpoints
+
+
 class QueryValuesResponse(ProtocolResponse):
   """A response to value requests.
   """
@@ -334,7 +473,7 @@ class AddBreakpointResponse(ProtocolResponse):
   """A response to add breakpoint requests.
   """
   def __init__(self, protocol, is_running, is_success, error_message, body,
-               protocol_id, *args, **kwargs):
+               protocol_id, actual_locations=None, *args, **kwargs):
     """Initializes an add breakpoint response.
 
     Args:
@@ -344,15 +483,21 @@ class AddBreakpointResponse(ProtocolResponse):
       error_message: An error message, if not successful.
       body: Raw body. Implementation-specific.
       protocol_id: Breakpoint protocol ID.
+      actual_locations: A list of (uri, line, column) target locations the
+                        breakpoint was bound to. Empty if the breakpoint did
+                        not resolve to any code.
     """
     super(AddBreakpointResponse, self).__init__(
         protocol, is_running, is_success, error_message, body, *args, **kwargs)
     self._protocol_id = protocol_id
-    # TODO(benvanik): actual location line/col
+    self._actual_locations = actual_locations or []
 
   def protocol_id(self):
     return self._protocol_id
 
+  def actual_locations(self):
+    return self._actual_locations
+
 
 class ProtocolEvent(object):
   """An event fired by the protocol.
@@ -395,6 +540,23 @@ class BreakEvent(ProtocolEvent):
     return self._breakpoint_ids
 
 
+class ScriptCompileEvent(ProtocolEvent):
+  """An event indicating that a script was compiled in the target.
+  """
+  def __init__(self, protocol, uri, *args, **kwargs):
+    """Initializes a script compile protocol event.
+
+    Args:
+      protocol: The protocol that fired this event.
+      uri: URI of the script that was compiled.
+    """
+    super(ScriptCompileEvent, self).__init__(protocol, (uri, 1, 1),
+                                             *args, **kwargs)
+
+  def uri(self):
+    return self._source[0]
+
+
 class ExceptionEvent(ProtocolEvent):
   """An event indicating that an exception occurred.
   """
@@ -423,6 +585,7 @@ class Frame(object):
                function_ref, this_ref, argument_vars, local_vars):
     self._ordinal = ordinal
     self._location = location
+    self._generated_location = location
     self._is_constructor = is_constructor
     self._is_at_return = is_at_return
     self._function_ref = function_ref
@@ -436,6 +599,18 @@ class Frame(object):
   def location(self):
     return self._location
 
+  def set_location(self, value):
+    """Sets the location displayed for the frame.
+    Used to map generated locations back to their original sources.
+
+    Args:
+      value: (uri, line, column) location.
+    """
+    self._location = value
+
+  def generated_location(self):
+    return self._generated_location
+
   def is_constructor(self):
     return self._is_constructor
 
@@ -454,9 +629,23 @@ class Frame(object):
   def local_refs(self):
     return self._locals
 
-  def formatted_call(self, handle_set):
+  def function_name(self, handle_set):
+    """Gets the name of the function the frame is in.
+
+    Args:
+      handle_set: HandleSet containing the function value.
+
+    Returns:
+      The function name, or '<anonymous>' if it has none or the function value
+      is not in the handle set.
+    """
     function = handle_set.get_value(self._function_ref)
-    s = '%s(' % (function.inferred_name() or function.name() or '<anonymous>')
+    if not function:
+      return '<anonymous>'
+    return function.inferred_name() or function.name() or '<anonymous>'
+
+  def formatted_call(self, handle_set):
+    s = '%s(' % (self.function_name(handle_set))
     for n in range(len(self._arguments)):
       var = self._arguments[n]
       var_name = var[0]
@@ -508,12 +697,60 @@ class Scope(object):
     return self._object_ref
 
 
+class TargetBreakpoint(object):
+  """A breakpoint as set in the target.
+  """
+  def __init__(self, protocol_id, location, function_name, is_enabled,
+               condition, actual_locations, *args, **kwargs):
+    """Initializes a target breakpoint.
+
+    Args:
+      protocol_id: Breakpoint protocol ID.
+      location: (uri, line, column) target location, if a location breakpoint.
+                Breakpoints on an entire line are at column 1, as when added.
+      function_name: Function name, if a function breakpoint.
+      is_enabled: True if the breakpoint is enabled.
+      condition: Condition expression, if any.
+      actual_locations: A list of (uri, line, column) target locations the
+                        breakpoint is bound to.
+    """
+    self._protocol_id = protocol_id
+    self._location = location
+    self._function_name = function_name
+    self._is_enabled = is_enabled
+    self._condition = condition
+    self._actual_locations = actual_locations
+
+  def protocol_id(self):
+    return self._protocol_id
+
+  def type(self):
+    if self._location:
+      return 'location'
+    return 'function'
+
+  def location(self):
+    return self._location
+
+  def function_name(self):
+    return self._function_name
+
+  def is_enabled(self):
+    return self._is_enabled
+
+  def condition(self):
+    return self._condition
+
+  def actual_locations(self):
+    return self._actual_locations
+
+
 class HandleSet(object):
   def __init__(self, *args, **kwargs):
     self._values = {}
 
   def merge(self, other):
-    for value in other._values:
+    for value in other._values.values():
       self.add_value(value)
 
   def add_value(self, value):
@@ -530,41 +767,164 @@ class HandleSet(object):
     for (key, value) in self._values.items():
       print '  %s: %s' % (key, value)
 
-  def print_value(self, key, handle_id):
-    dumper = _RecursiveDumper(self)
+  def print_value(self, key, handle_id, format='text', max_depth=None,
+                  max_size=None):
+    """Formats a value and everything reachable from it.
+
+    Args:
+      key: Name to show the value with, or None.
+      handle_id: Handle ID of the value.
+      format: 'text' or 'json'.
+      max_depth: Maximum number of levels of objects to expand, or None.
+      max_size: Size at which output stops, or None.
+
+    Returns:
+      The formatted value.
+    """
+    output = []
+    dumper = ValueDumper(self, output, format=format, max_depth=max_depth,
+                         max_size=max_size)
     dumper.dump(key, self.get_value(handle_id))
-    return dumper.output()
+    return ''.join(output)
+
 
+class ValueDumper(object):
+  """Writes a value and the object graph reachable from it to a sink.
+  The graph is walked without recursion and written as it is walked, so the
+  cost is linear in the size of the output. Each object is expanded only once,
+  which also ends cycles, and output can be bounded by depth and size.
+
+  Text output has one indented 'key: value' line per value. JSON output nests
+  expanded objects, and writes all other values as JSON scalars or strings.
+  """
+  def __init__(self, handle_set, sink, format='text', max_depth=None,
+               max_size=None, *args, **kwargs):
+    """Initializes a value dumper.
 
-class _RecursiveDumper(object):
-  def __init__(self, handle_set):
+    Args:
+      handle_set: HandleSet containing the values to dump.
+      sink: A list to append output to, or a file-like object to write it to.
+      format: 'text' or 'json'.
+      max_depth: Maximum number of levels of objects to expand, or None.
+      max_size: Size at which output stops, or None. JSON output still closes
+                all open objects.
+    """
     self._handle_set = handle_set
-    self._stack = []
-    self._output = ''
+    if isinstance(sink, list):
+      self._write_sink = sink.append
+    else:
+      self._write_sink = sink.write
+    self._format = format
+    self._max_depth = max_depth
+    self._max_size = max_size
+    self._size = 0
+    self._is_truncated = False
+    # Handle IDs of all expanded objects
+    self._visited = set()
+
+  def is_truncated(self):
+    return self._is_truncated
+
+  def _write(self, value):
+    self._size += len(value)
+    self._write_sink(value)
 
-  def output(self):
-    return self._output
+  def _is_full(self):
+    return self._max_size is not None and self._size >= self._max_size
+
+  def _get_children(self, value, depth):
+    """Gets the properties of a value if it should be expanded.
+    The value is marked as expanded.
+
+    Args:
+      value: Value being dumped.
+      depth: Depth of the value.
+
+    Returns:
+      A list of (name, value) tuples, or None if the value is not expanded.
+    """
+    if not isinstance(value, JSObject) or isinstance(value, JSFunction):
+      return None
+    if value.handle_id() in self._visited:
+      return None
+    if self._max_depth is not None and depth >= self._max_depth:
+      return None
+    self._visited.add(value.handle_id())
+    return [(p.name(), self._handle_set.get_value(p.ref()))
+            for p in value.properties()]
 
   def dump(self, key, value):
-    if key:
-      indent = ''.join(['  ' for n in range(len(self._stack))])
-      self._output += '%s%s: %s\n' % (indent, key, value)
-    if value in self._stack:
-      return
-    if isinstance(value, JSObject):
-      self._stack.append(value)
-      if isinstance(value, JSFunction):
-        self._dump_function(value)
-      else:
-        self._dump_object(value)
-      self._stack.pop()
-
-  def _dump_function(self, value):
-    pass
-
-  def _dump_object(self, value):
-    for p in value.properties():
-      self.dump(p.name(), self._handle_set.get_value(p.ref()))
+    """Writes a value to the sink.
+
+    Args:
+      key: Name to show the value with, or None. Only used for text.
+      value: Value to dump.
+    """
+    if self._format == 'json':
+      self._dump_json(value)
+    else:
+      self._dump_text(key, value)
+
+  def _dump_text(self, key, value):
+    # Entries still to write, as (key, value, depth), last first
+    stack = [(key, value, 0)]
+    while len(stack):
+      if self._is_full():
+        self._is_truncated = True
+        self._write('...\n')
+        return
+      (key, value, depth) = stack.pop()
+      if key is not None:
+        self._write('%s%s: %s\n' % ('  ' * depth, key, value))
+      children = self._get_children(value, depth)
+      if children:
+        for (child_key, child_value) in reversed(children):
+          stack.append((child_key, child_value, depth + 1))
+
+  def _dump_json(self, value):
+    # Entries still to write, as (key, value, depth, separator), or strings
+    # closing expanded objects, last first
+    stack = [(None, value, 0, '')]
+    while len(stack):
+      entry = stack.pop()
+      if isinstance(entry, basestring):
+        self._write(entry)
+        continue
+      if self._is_full():
+        # Drop everything but the closing of open objects
+        self._is_truncated = True
+        stack = [item for item in stack if isinstance(item, basestring)]
+        continue
+      (key, value, depth, separator) = entry
+      self._write(separator)
+      if key is not None:
+        self._write('%s: ' % (json.dumps(unicode(key))))
+      children = self._get_children(value, depth)
+      if children is None:
+        self._write(json.dumps(self._to_json_scalar(value)))
+        continue
+      self._write('{')
+      stack.append('}')
+      for n in reversed(range(len(children))):
+        (child_key, child_value) = children[n]
+        stack.append((child_key, child_value, depth + 1, ', ' if n else ''))
+
+  def _to_json_scalar(self, value):
+    """Converts a value that is not expanded to a JSON value.
+
+    Args:
+      value: Value, or None if it was not in the handle set.
+
+    Returns:
+      A JSON-serializable value.
+    """
+    if (value is None or isinstance(value, JSNull) or
+        isinstance(value, JSUndefined)):
+      return None
+    if (isinstance(value, JSBoolean) or isinstance(value, JSNumber) or
+        isinstance(value, JSString)):
+      return value.value()
+    return '%s' % (value)
 
 
 class JSHandle(object):
@@ -579,6 +939,18 @@ class JSHandle(object):
     return self._handle_type
 
 
+class JSUnknown(JSHandle):
+  def __init__(self, handle_id, handle_type, text, *args, **kwargs):
+    super(JSUnknown, self).__init__(handle_id, handle_type, *args, **kwargs)
+    self._text = text
+
+  def text(self):
+    return self._text
+
+  def __repr__(self):
+    return self._text or '<%s>' % (self.handle_type())
+
+
 class JSUndefined(JSHandle):
   def __init__(self, handle_id, *args, **kwargs):
     super(JSUndefined, self).__init__(handle_id, 'undefined', *args, **kwargs)
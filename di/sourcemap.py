@@ -0,0 +1,758 @@
+# Copyright 2012 Google Inc. All Rights Reserved.
+
+__author__ = 'benvanik@google.com (Ben Vanik)'
+
+
+from array import array
+import base64
+import bisect
+import json
+import os
+import re
+import urllib
+
+
+# Matches the source map comment at the end of generated files
+_SOURCE_MAPPING_URL_RE = re.compile(r'//[@#]\s*sourceMappingURL=(\S+)')
+# Bytes read from the end of generated files when looking for the comment
+_SOURCE_MAPPING_URL_TAIL_SIZE = 64 * 1024
+
+# Base64 VLQ digit values, by character
+_VLQ_DIGITS = {}
+for n in range(64):
+  _VLQ_DIGITS[
+      'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'[n]] = n
+_VLQ_CONTINUATION_BIT = 32
+_VLQ_VALUE_MASK = 31
+# Matches a mapping segment of 1, 4 or 5 VLQ values, capturing the digits of
+# each value - values end at the first digit without the continuation bit.
+# Segments with any other number of values are invalid and never match.
+_VLQ_VALUE = r'[g-z0-9+/]*[A-Za-f]'
+_SEGMENT_RE = re.compile(r'(?<![^,;])(%s)(?:(%s)(%s)(%s)(%s)?)?(?![^,;])' % (
+    (_VLQ_VALUE,) * 5))
+# Matches a mapping segment that has a source, capturing the digits of each
+# value after the generated column
+_SEGMENT_FIELDS_RE = re.compile(r'(?<![^,;])%s(%s)(%s)(%s)(%s)?(?![^,;])' % (
+    (_VLQ_VALUE,) * 5))
+# Matches any character that is not valid in a mappings string
+_INVALID_MAPPINGS_RE = re.compile(r'[^A-Za-z0-9+/,;]')
+
+# Fields stored per mapping segment, not counting the generated column
+_SEGMENT_FIELDS = 4
+# Generated lines between stored decoder states
+_CHECKPOINT_INTERVAL = 256
+
+
+def _normalize_path(path):
+  """Normalizes a local path for use as a lookup key.
+
+  Args:
+    path: Local path.
+
+  Returns:
+    A normalized path.
+  """
+  return os.path.normcase(os.path.normpath(path))
+
+
+def find_source_map_url(generated_path):
+  """Finds the source map URL of a generated file.
+  Only the end of the file is read, unless the map is inlined as a data URI
+  that extends beyond it.
+
+  Args:
+    generated_path: Local path of the generated file.
+
+  Returns:
+    The source map URL, or None if the file has no source map.
+  """
+  try:
+    with open(generated_path, 'rb') as f:
+      f.seek(0, os.SEEK_END)
+      size = f.tell()
+      f.seek(max(0, size - _SOURCE_MAPPING_URL_TAIL_SIZE))
+      tail = f.read()
+      match = None
+      for match in _SOURCE_MAPPING_URL_RE.finditer(tail):
+        pass
+      if (match and match.group(1).startswith('data:') and
+          match.end() == len(tail.rstrip()) and
+          size > _SOURCE_MAPPING_URL_TAIL_SIZE):
+        # Inline map that may have been cut off - read the whole file
+        f.seek(0)
+        for match in _SOURCE_MAPPING_URL_RE.finditer(f.read()):
+          pass
+  except IOError:
+    return None
+  if not match:
+    return None
+  return match.group(1)
+
+
+def _load_source_map_text(url, generated_path):
+  """Loads the contents of a source map.
+
+  Args:
+    url: Source map URL, as found in the generated file.
+    generated_path: Local path of the generated file.
+
+  Returns:
+    A tuple of (map path, JSON text), or (None, None) if it could not be
+    loaded. Inline maps have the generated file path as their map path.
+  """
+  if url.startswith('data:'):
+    (header, _, data) = url.partition(',')
+    if header.endswith(';base64'):
+      try:
+        return (generated_path, base64.b64decode(data))
+      except TypeError:
+        return (None, None)
+    return (generated_path, urllib.unquote(data))
+  if url.startswith('file://'):
+    url = url[len('file://'):]
+  elif '://' in url:
+    # Remote maps are not supported
+    return (None, None)
+  map_path = os.path.normpath(os.path.join(os.path.dirname(generated_path),
+                                           urllib.unquote(url)))
+  try:
+    with open(map_path, 'rb') as f:
+      return (map_path, f.read())
+  except IOError:
+    return (None, None)
+
+
+def _split_mappings(text):
+  """Extracts the mappings string from source map JSON.
+  The mappings string is the bulk of large maps, and as it almost never
+  contains escapes it can be sliced out directly instead of going through the
+  JSON parser.
+
+  Args:
+    text: Source map JSON text.
+
+  Returns:
+    A tuple of (JSON text with empty mappings, mappings string). If the
+    mappings contain escapes the JSON text is returned unchanged with None
+    mappings, and they must be read from the parsed JSON.
+  """
+  key_index = text.find('"mappings"')
+  if key_index == -1:
+    return (text, '')
+  start = text.find('"', text.find(':', key_index) + 1) + 1
+  end = text.find('"', start)
+  if not start or end == -1:
+    return (text, '')
+  mappings = text[start:end]
+  if '\\' in mappings:
+    return (text, None)
+  return (text[:start] + text[end:], mappings)
+
+
+def _decode_vlq(text):
+  """Decodes a single base64 VLQ value.
+
+  Args:
+    text: VLQ digits of the value.
+
+  Returns:
+    The signed value.
+  """
+  value = 0
+  shift = 0
+  for c in text:
+    value += (_VLQ_DIGITS[c] & _VLQ_VALUE_MASK) << shift
+    shift += 5
+  if value & 1:
+    return -(value >> 1)
+  return value >> 1
+
+
+class SourceMap(object):
+  """A parsed version 3 source map.
+  Mappings are kept as the raw VLQ string and decoded lazily, one generated
+  line at a time, the first time that line is looked up. Decoded lines are
+  stored as compact integer arrays and searched with a binary search on the
+  generated column. The decoder state is checkpointed every
+  _CHECKPOINT_INTERVAL lines, so a lookup only decodes the lines after the
+  nearest checkpoint.
+
+  All lines and columns are 1-based, like the rest of the debugger.
+  """
+  def __init__(self, map_path, generated_path, text, *args, **kwargs):
+    """Initializes a source map.
+
+    Args:
+      map_path: Local path the source map was loaded from.
+      generated_path: Local path of the generated file.
+      text: Source map JSON text.
+
+    Raises:
+      ValueError: The source map could not be parsed.
+    """
+    (text, mappings) = _split_mappings(text)
+    blob = json.loads(text)
+    if blob.get('version', 3) != 3 or 'sections' in blob:
+      raise ValueError('Unsupported source map format')
+    if mappings is None:
+      mappings = blob.get('mappings', None) or ''
+    if (not isinstance(mappings, basestring) or
+        _INVALID_MAPPINGS_RE.search(mappings)):
+      raise ValueError('Invalid mappings')
+    mappings = str(mappings)
+    self._map_path = map_path
+    self._generated_path = generated_path
+    self._names = blob.get('names', [])
+    source_root = blob.get('sourceRoot', None) or ''
+    base_path = os.path.dirname(map_path)
+    self._sources = []
+    for source in blob.get('sources', []):
+      source = source_root + source if source_root else source
+      if source.startswith('file://'):
+        source = source[len('file://'):]
+      if not '://' in source:
+        source = os.path.normpath(os.path.join(base_path, source))
+      self._sources.append(source)
+
+    self._mappings = mappings
+    # Offsets of the start of each generated line in the mappings string
+    self._line_starts = array('l', [0])
+    index = mappings.find(';')
+    while index != -1:
+      self._line_starts.append(index + 1)
+      index = mappings.find(';', index + 1)
+    # Decoder state at the start of every _CHECKPOINT_INTERVAL lines, as
+    # [source, original line, original column, name] - only known for lines
+    # that have been reached
+    self._line_states = array('l', [0, 0, 0, 0])
+    # Decoded lines as (generated columns, segment fields), by line index
+    self._lines = {}
+    # Decoded VLQ values, by VLQ digits
+    self._values = {'': 0}
+    # Source indices, by normalized source path
+    self._source_indices = {}
+    for n in range(len(self._sources)):
+      self._source_indices[_normalize_path(self._sources[n])] = n
+    # Reverse mappings of sources that have been looked up, by source index,
+    # as (sorted original lines, {original line: [original column, generated
+    # line, generated column, ...]})
+    self._reverse_indices = {}
+
+  def map_path(self):
+    return self._map_path
+
+  def generated_path(self):
+    return self._generated_path
+
+  def sources(self):
+    return self._sources
+
+  def names(self):
+    return self._names
+
+  def line_count(self):
+    return len(self._line_starts)
+
+  def _decode_values(self, texts):
+    """Decodes a list of VLQ values.
+    Values repeat a lot, so each distinct one is only decoded once per map.
+
+    Args:
+      texts: A list of the VLQ digits of each value, or empty digits for
+             values that are not present.
+
+    Returns:
+      A list of the signed values, with 0 for values that are not present.
+    """
+    values = self._values
+    for text in set(texts).difference(values):
+      values[text] = _decode_vlq(text)
+    return map(values.__getitem__, texts)
+
+  def _advance_state(self, start, end, state):
+    """Advances the decoder state over part of the mappings string.
+    Only the deltas of each field are summed, which is much faster than
+    decoding the lines.
+
+    Args:
+      start: Offset of the first character in the mappings string.
+      end: Offset after the last character in the mappings string.
+      state: Decoder state at the start offset. Updated in place to the state
+             at the end offset.
+
+    Returns:
+      True if any segment in the range changes the source.
+    """
+    segments = _SEGMENT_FIELDS_RE.findall(self._mappings, start, end)
+    if not segments:
+      return False
+    fields = zip(*segments)
+    deltas = [sum(self._decode_values(texts)) for texts in fields]
+    for n in range(_SEGMENT_FIELDS):
+      state[n] += deltas[n]
+    return fields[0].count('A') != len(segments)
+
+  def _line_range(self, line_index):
+    """Gets the range of a generated line in the mappings string.
+
+    Args:
+      line_index: 0-based generated line.
+
+    Returns:
+      A tuple of (start, end) offsets, not including the line separator.
+    """
+    start = self._line_starts[line_index]
+    if line_index + 1 < len(self._line_starts):
+      return (start, self._line_starts[line_index + 1] - 1)
+    return (start, len(self._mappings))
+
+  def _decode_line(self, line_index, state):
+    """Decodes the segments of a single generated line.
+
+    Args:
+      line_index: 0-based generated line.
+      state: Decoder state at the start of the line. Updated in place to the
+             state at the end of the line.
+
+    Returns:
+      A tuple of (generated columns, segment fields) arrays. Each segment has
+      _SEGMENT_FIELDS fields of [source, original line, original column,
+      name], with -1 for fields that are not present.
+    """
+    (start, end) = self._line_range(line_index)
+    segments = _SEGMENT_RE.findall(self._mappings, start, end)
+    if not segments:
+      return (array('l'), array('l'))
+    columns = []
+    fields = []
+    column = 0
+    (source, original_line, original_column, name) = state
+    values = zip(*[self._decode_values(texts) for texts in zip(*segments)])
+    for n in range(len(segments)):
+      segment = values[n]
+      column += segment[0]
+      columns.append(column)
+      if not segments[n][1]:
+        fields.extend((-1, -1, -1, -1))
+        continue
+      source += segment[1]
+      original_line += segment[2]
+      original_column += segment[3]
+      if segments[n][4]:
+        name += segment[4]
+        fields.extend((source, original_line, original_column, name))
+      else:
+        fields.extend((source, original_line, original_column, -1))
+    state[:] = [source, original_line, original_column, name]
+    return (array('l', columns), array('l', fields))
+
+  def _get_state(self, line_index):
+    """Gets the decoder state at the start of a generated line.
+    Checkpoints that have not been reached yet are stored along the way, and
+    the state is then advanced from the nearest checkpoint.
+
+    Args:
+      line_index: 0-based generated line.
+
+    Returns:
+      The decoder state, as a list of [source, original line, original column,
+      name].
+    """
+    checkpoint = line_index / _CHECKPOINT_INTERVAL
+    known_count = len(self._line_states) / _SEGMENT_FIELDS
+    while known_count <= checkpoint:
+      offset = (known_count - 1) * _SEGMENT_FIELDS
+      state = list(self._line_states[offset:offset + _SEGMENT_FIELDS])
+      self._advance_state(
+          self._line_starts[(known_count - 1) * _CHECKPOINT_INTERVAL],
+          self._line_starts[known_count * _CHECKPOINT_INTERVAL],
+          state)
+      self._line_states.extend(state)
+      known_count += 1
+    offset = checkpoint * _SEGMENT_FIELDS
+    state = list(self._line_states[offset:offset + _SEGMENT_FIELDS])
+    self._advance_state(self._line_starts[checkpoint * _CHECKPOINT_INTERVAL],
+                        self._line_starts[line_index], state)
+    return state
+
+  def _get_line(self, line_index):
+    """Gets the decoded segments of a generated line, decoding if required.
+    Decoding a line requires the decoder state at its start, which is found
+    from the nearest checkpoint before it.
+
+    Args:
+      line_index: 0-based generated line.
+
+    Returns:
+      A tuple of (generated columns, segment fields) arrays, or None if the
+      line is out of range.
+    """
+    if line_index < 0 or line_index >= len(self._line_starts):
+      return None
+    line = self._lines.get(line_index, None)
+    if line:
+      return line
+    line = self._decode_line(line_index, self._get_state(line_index))
+    self._lines[line_index] = line
+    return line
+
+  def get_original_location(self, line, column):
+    """Maps a generated location to its original location.
+    The closest mapping at or before the column is used. If the column is
+    before the first mapping on the line the first mapping is used.
+
+    Args:
+      line: 1-based generated line.
+      column: 1-based generated column.
+
+    Returns:
+      A (source, line, column) location, or None if there is no mapping.
+    """
+    decoded = self._get_line(line - 1)
+    if not decoded or not len(decoded[0]):
+      return None
+    (columns, fields) = decoded
+    n = max(0, bisect.bisect_right(columns, column - 1) - 1)
+    offset = n * _SEGMENT_FIELDS
+    source_index = fields[offset]
+    if source_index < 0 or source_index >= len(self._sources):
+      return None
+    return (self._sources[source_index],
+            fields[offset + 1] + 1,
+            fields[offset + 2] + 1)
+
+  def _add_reverse_entries(self, entries, line_index, state):
+    """Adds the segments of a generated line to reverse mappings.
+    The line is reused if it has already been decoded.
+
+    Args:
+      entries: Reverse mappings being built, as {source index: {original line:
+               [original column, generated line, generated column, ...]}}.
+      line_index: 0-based generated line.
+      state: Decoder state at the start of the line. Updated in place to the
+             state at the end of the line.
+    """
+    line = self._lines.get(line_index, None)
+    if line:
+      (start, end) = self._line_range(line_index)
+      self._advance_state(start, end, state)
+    else:
+      line = self._decode_line(line_index, state)
+    (columns, fields) = line
+    for n in range(len(columns)):
+      offset = n * _SEGMENT_FIELDS
+      source_entries = entries.get(fields[offset], None)
+      if source_entries is None:
+        continue
+      original_line = fields[offset + 1]
+      line_entries = source_entries.get(original_line, None)
+      if line_entries is None:
+        line_entries = array('l')
+        source_entries[original_line] = line_entries
+      line_entries.extend([fields[offset + 2], line_index, columns[n]])
+
+  def _build_reverse_indices(self, source_indices):
+    """Builds the reverse mappings for the given sources.
+    This requires decoding every line of the map, so all sources that are
+    needed should be passed at once. Only blocks of lines that can contain
+    the sources are decoded, and checkpoints that have not been reached are
+    stored along the way.
+
+    Args:
+      source_indices: A list of source indices.
+    """
+    entries = {}
+    for source_index in source_indices:
+      if not source_index in self._reverse_indices:
+        entries[source_index] = {}
+    if not len(entries):
+      return
+    state = [0, 0, 0, 0]
+    line_count = len(self._line_starts)
+    for first_line in xrange(0, line_count, _CHECKPOINT_INTERVAL):
+      checkpoint = first_line / _CHECKPOINT_INTERVAL
+      if len(self._line_states) / _SEGMENT_FIELDS == checkpoint:
+        self._line_states.extend(state)
+      last_line = min(first_line + _CHECKPOINT_INTERVAL, line_count)
+      if last_line < line_count:
+        end = self._line_starts[last_line]
+      else:
+        end = len(self._mappings)
+      # Blocks that stay within another source can be skipped entirely
+      line_state = list(state)
+      if (self._advance_state(self._line_starts[first_line], end, state) or
+          state[0] in entries):
+        for line_index in xrange(first_line, last_line):
+          self._add_reverse_entries(entries, line_index, line_state)
+    for (source_index, source_entries) in entries.items():
+      for (original_line, line_entries) in source_entries.items():
+        triples = []
+        for n in range(0, len(line_entries), 3):
+          triples.append(tuple(line_entries[n:n + 3]))
+        triples.sort()
+        sorted_entries = array('l')
+        for triple in triples:
+          sorted_entries.extend(triple)
+        source_entries[original_line] = sorted_entries
+      self._reverse_indices[source_index] = (
+          array('l', sorted(source_entries.keys())), source_entries)
+
+  def get_generated_locations(self, locations):
+    """Maps original locations to generated locations.
+    Locations that fall on lines without mappings are moved to the next mapped
+    line, and line-only locations (column 1) map to the first mapping on the
+    line. The map is decoded at most once for all of the given locations.
+
+    Args:
+      locations: A list of (source, line, column) original locations.
+
+    Returns:
+      A list of (line, column) generated locations, or None for locations
+      that are not mapped, in the same order as the given locations.
+    """
+    source_indices = []
+    for location in locations:
+      source_index = self._source_indices.get(_normalize_path(location[0]),
+                                              None)
+      source_indices.append(source_index)
+    self._build_reverse_indices(
+        [n for n in source_indices if n is not None])
+
+    results = []
+    for n in range(len(locations)):
+      (source, line, column) = locations[n]
+      if source_indices[n] is None:
+        results.append(None)
+        continue
+      (lines, source_entries) = self._reverse_indices[source_indices[n]]
+      line_index = bisect.bisect_left(lines, line - 1)
+      if line_index >= len(lines):
+        results.append(None)
+        continue
+      original_line = lines[line_index]
+      line_entries = source_entries[original_line]
+      offset = 0
+      if original_line == line - 1 and column > 1:
+        # First mapping at or after the column, or the last on the line
+        offset = len(line_entries) - 3
+        for entry_offset in range(0, len(line_entries), 3):
+          if line_entries[entry_offset] >= column - 1:
+            offset = entry_offset
+            break
+      results.append((line_entries[offset + 1] + 1,
+                      line_entries[offset + 2] + 1))
+    return results
+
+  def get_original_name(self, line, column):
+    """Gets the original symbol name at a generated location.
+
+    Args:
+      line: 1-based generated line.
+      column: 1-based generated column.
+
+    Returns:
+      The original name, if the mapping has one.
+    """
+    decoded = self._get_line(line - 1)
+    if not decoded or not len(decoded[0]):
+      return None
+    (columns, fields) = decoded
+    n = max(0, bisect.bisect_right(columns, column - 1) - 1)
+    name_index = fields[n * _SEGMENT_FIELDS + 3]
+    if name_index < 0 or name_index >= len(self._names):
+      return None
+    return self._names[name_index]
+
+
+class SourceMapCache(object):
+  """A bounded cache of source maps for generated files.
+  Maps are discovered from the sourceMappingURL comment of generated files and
+  loaded on first use. Only the most recently used maps are retained, and maps
+  are reloaded when their generated file changes.
+  """
+  def __init__(self, max_size=8, resolve_path=None, *args, **kwargs):
+    """Initializes a source map cache.
+
+    Args:
+      max_size: Maximum number of source maps to keep loaded.
+      resolve_path: A function that maps a script URI to a local path, or
+                    None if script URIs are local paths.
+    """
+    self._max_size = max_size
+    self._resolve_path = resolve_path
+    # Loaded maps as (mtime, SourceMap), by generated path
+    self._source_maps = {}
+    # Generated paths of loaded maps, least recently used first
+    self._lru = []
+    # mtimes of generated files that have no source map, by generated path
+    self._unmapped = {}
+    # Generated script URIs, by normalized original source path
+    self._scripts_by_source = {}
+
+  def set_resolve_path(self, value):
+    self._resolve_path = value
+    self.clear()
+
+  def clear(self):
+    """Drops all loaded maps.
+    """
+    self._source_maps = {}
+    self._lru = []
+    self._unmapped = {}
+    self._scripts_by_source = {}
+
+  def _touch(self, generated_path):
+    """Marks a map as most recently used.
+
+    Args:
+      generated_path: Generated path of the map.
+    """
+    if self._lru and self._lru[-1] == generated_path:
+      return
+    if generated_path in self._lru:
+      self._lru.remove(generated_path)
+    self._lru.append(generated_path)
+    while len(self._lru) > self._max_size:
+      del self._source_maps[self._lru.pop(0)]
+
+  def get_source_map(self, uri):
+    """Gets the source map of a generated script, loading it if required.
+
+    Args:
+      uri: Script URI.
+
+    Returns:
+      A SourceMap, or None if the script has no source map.
+    """
+    generated_path = self._resolve_path(uri) if self._resolve_path else uri
+    if not generated_path:
+      return None
+    try:
+      mtime = os.path.getmtime(generated_path)
+    except OSError:
+      return None
+    if self._unmapped.get(generated_path, None) == mtime:
+      return None
+    entry = self._source_maps.get(generated_path, None)
+    if entry and entry[0] == mtime:
+      self._touch(generated_path)
+      return entry[1]
+
+    source_map = None
+    url = find_source_map_url(generated_path)
+    if url:
+      (map_path, text) = _load_source_map_text(url, generated_path)
+      if text:
+        try:
+          source_map = SourceMap(map_path, generated_path, text)
+        except ValueError, e:
+          print 'STDI: unable to parse source map %s: %s' % (map_path, e)
+    if not source_map:
+      self._unmapped[generated_path] = mtime
+      if generated_path in self._source_maps:
+        del self._source_maps[generated_path]
+        self._lru.remove(generated_path)
+      return None
+    print 'STDI: loaded source map %s' % (source_map.map_path())
+    self._source_maps[generated_path] = (mtime, source_map)
+    self._touch(generated_path)
+    for source in source_map.sources():
+      self._scripts_by_source[_normalize_path(source)] = uri
+    return source_map
+
+  def register_scripts(self, uris):
+    """Registers scripts loaded in the target.
+    The source maps of the scripts are discovered so that original locations
+    can be mapped back to them.
+
+    Args:
+      uris: A list of script URIs.
+
+    Returns:
+      A list of the script URIs whose source maps were newly loaded.
+    """
+    loaded_maps = [entry[1] for entry in self._source_maps.values()]
+    mapped_uris = []
+    for uri in uris:
+      source_map = self.get_source_map(uri)
+      if source_map and not source_map in loaded_maps:
+        mapped_uris.append(uri)
+    return mapped_uris
+
+  def get_script_for_source(self, path):
+    """Gets the generated script that an original source is compiled into.
+    Only scripts that have been registered or looked up are known.
+
+    Args:
+      path: Original source path.
+
+    Returns:
+      The generated script URI, or None if the source is not known.
+    """
+    return self._scripts_by_source.get(_normalize_path(path), None)
+
+  def get_original_location(self, location):
+    """Maps a generated location to its original location.
+
+    Args:
+      location: (uri, line, column) generated location.
+
+    Returns:
+      The original (uri, line, column) location, or the given location if it
+      is not mapped.
+    """
+    return self.get_original_locations([location])[0]
+
+  def get_original_locations(self, locations):
+    """Maps generated locations to their original locations.
+    Each source map is looked up only once for all of the given locations.
+
+    Args:
+      locations: A list of (uri, line, column) generated locations.
+
+    Returns:
+      A list of original (uri, line, column) locations in the same order as the
+      given locations. Locations that are not mapped are returned unchanged.
+    """
+    source_maps = {}
+    results = []
+    for location in locations:
+      (uri, line, column) = location
+      if not uri in source_maps:
+        source_maps[uri] = self.get_source_map(uri)
+      source_map = source_maps[uri]
+      if source_map:
+        location = source_map.get_original_location(line, column) or location
+      results.append(location)
+    return results
+
+  def get_generated_locations(self, locations):
+    """Maps original locations to generated locations.
+    Locations are grouped by generated script so that each source map is
+    looked up and decoded only once.
+
+    Args:
+      locations: A list of (path, line, column) original locations.
+
+    Returns:
+      A list of generated (uri, line, column) locations in the same order as
+      the given locations. Locations that are not mapped are returned
+      unchanged.
+    """
+    results = list(locations)
+    indices_by_script = {}
+    for n in range(len(locations)):
+      script_uri = self.get_script_for_source(locations[n][0])
+      if script_uri:
+        indices_by_script.setdefault(script_uri, []).append(n)
+    for (script_uri, indices) in indices_by_script.items():
+      source_map = self.get_source_map(script_uri)
+      if not source_map:
+        continue
+      generated_locations = source_map.get_generated_locations(
+          [locations[n] for n in indices])
+      for n in range(len(indices)):
+        if generated_locations[n]:
+          (line, column) = generated_locations[n]
+          results[indices[n]] = (script_uri, line, column)
+    return results
@@ -3,6 +3,9 @@
 __author__ = 'benvanik@google.com (Ben Vanik)'
 
 
+import os
+
+
 # NOTE: this file, when modified, may break things if ST is running
 
 
@@ -29,3 +32,19 @@ def close_open_protocols():
   for protocol in _open_protocols:
     protocol.detach(terminate=False)
   _open_protocols = []
+
+
+def replace_file(source_path, target_path):
+  """Moves a file over another, atomically where the platform allows.
+  On Windows os.rename fails if the target exists, so the target is removed
+  first.
+
+  Args:
+    source_path: Path of the file to move.
+    target_path: Path to replace.
+  """
+  try:
+    os.rename(source_path, target_path)
+  except OSError:
+    os.remove(target_path)
+    os.rename(source_path, target_path)
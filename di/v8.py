@@ -170,11 +170,17 @@ class V8DebuggerProtocol(DebuggerProtocol):
         'filter': uri,
         }, _got_scripts)
 
-  def add_breakpoint(self, breakpoint, callback):
+  def query_scripts(self, callback):
+    print 'V8: query scripts'
+    self._send_command('scripts', {
+        'types': 4,
+        'includeSource': False,
+        }, lambda response: callback(response))
+
+  def add_breakpoint(self, breakpoint, location, callback):
     print 'V8: add breakpoint %s' % (breakpoint.id())
     if breakpoint.type() == 'location':
       breakpoint_type = 'script'
-      location = breakpoint.location()
       (target, target_line, target_column) = location
     elif breakpoint.type() == 'function':
       breakpoint_type = 'function'
@@ -211,6 +217,36 @@ class V8DebuggerProtocol(DebuggerProtocol):
         'breakpoint': protocol_id,
         }, lambda response: callback(response))
 
+  def query_breakpoints(self, callback):
+    print 'V8: query breakpoints'
+    self._send_command('listbreakpoints', None,
+                       lambda response: callback(response))
+
+  def set_exception_break(self, break_type, enabled, callback):
+    print 'V8: set exception break %s=%s' % (break_type, enabled)
+    self._send_command('setexceptionbreak', {
+        'type': break_type,
+        'enabled': enabled,
+        }, lambda response: callback(response))
+
+  def evaluate(self, expression, frame, disable_break, callback):
+    print 'V8: evaluate %s' % (expression)
+    arguments = {
+        'expression': expression,
+        'disable_break': disable_break,
+        }
+    if frame:
+      arguments['frame'] = frame.ordinal()
+    else:
+      arguments['global'] = True
+    return self._send_command('evaluate', arguments,
+                              lambda response: callback(response))
+
+  def cancel_request(self, request_id):
+    if request_id in self._pending_callbacks:
+      print 'V8: cancel request %s' % (request_id)
+      del self._pending_callbacks[request_id]
+
   def query_values(self, handle_ids, callback):
     print 'V8: query values %s' % (handle_ids)
     self._send_command('lookup', {
@@ -233,6 +269,9 @@ class V8DebuggerProtocol(DebuggerProtocol):
       command: Command name (like 'continue').
       command_obj: A dict of command parameters.
       callback: Optional callback function to receive the result.
+
+    Returns:
+      The sequence ID of the request.
     """
     seq_id = self._seq_id
     self._seq_id += 1
@@ -253,6 +292,7 @@ class V8DebuggerProtocol(DebuggerProtocol):
                                                     command_encoded)
     print 'V8 send: %s' % (command_encoded)
     self._socket.sendall(packet_str)
+    return seq_id
 
   def queue_recv_from_thread(self, recv_obj):
     """Queues a receive from a background thread.
@@ -288,6 +328,9 @@ class V8DebuggerProtocol(DebuggerProtocol):
         elif recv_obj['event'] == 'exception':
           # Exception (unhandled/first-throw, etc)
           self._handle_exception_event(recv_obj)
+        elif recv_obj['event'] == 'afterCompile':
+          # New script (require/eval/etc)
+          self._handle_after_compile_event(recv_obj)
 
   def _handle_response(self, recv_obj):
     """Handles a response from the remote debugger.
@@ -308,10 +351,20 @@ class V8DebuggerProtocol(DebuggerProtocol):
     response_type = ProtocolResponse
     kwargs = {}
     response_command = recv_obj.get('command', '')
-    # if response_command == 'evaluate':
-    #   response_type = EvaluateResponse
-    #   kwargs = {}
-    if response_command == 'lookup':
+    if response_command == 'evaluate':
+      response_type = EvaluateResponse
+      handle_set = HandleSet()
+      ref_objs = recv_obj.get('refs', [])
+      self._populate_handle_set_from_list(handle_set, ref_objs)
+      value = None
+      if success and body:
+        self._add_handle_to_set(handle_set, body)
+        value = handle_set.get_value(body['handle'])
+      kwargs = {
+          'handle_set': handle_set,
+          'value': value,
+          }
+    elif response_command == 'lookup':
       response_type = QueryValuesResponse
       handle_set = HandleSet()
       self._populate_handle_set_from_map(handle_set, body)
@@ -343,6 +396,49 @@ class V8DebuggerProtocol(DebuggerProtocol):
           'handle_set': handle_set,
           'frames': frames,
           }
+    elif response_command == 'scripts':
+      response_type = QueryScriptsResponse
+      uris = []
+      for script_obj in body or []:
+        if script_obj.get('name', None):
+          uris.append(script_obj['name'])
+      kwargs = {
+          'uris': uris,
+          }
+    elif response_command == 'listbreakpoints':
+      response_type = QueryBreakpointsResponse
+      breakpoints = []
+      for breakpoint_obj in (body or {}).get('breakpoints', []):
+        breakpoint_type = breakpoint_obj.get('type', None)
+        location = None
+        actual_locations = []
+        if breakpoint_type == 'scriptName':
+          # Breakpoints without a column cover the entire line, like those
+          # added at column 1
+          column = breakpoint_obj.get('column', None)
+          if column is None or column < 0:
+            column = 0
+          location = (breakpoint_obj['script_name'],
+                      breakpoint_obj['line'] + 1,
+                      column + 1)
+          for location_obj in breakpoint_obj.get('actual_locations', []):
+            actual_locations.append((breakpoint_obj['script_name'],
+                                     location_obj['line'] + 1,
+                                     location_obj['column'] + 1))
+        elif breakpoint_type != 'scriptId':
+          continue
+        # V8 lists function breakpoints by the script they were bound in,
+        # without the function name, so they can't be matched and are cleared
+        breakpoints.append(TargetBreakpoint(
+            breakpoint_obj['number'],
+            location,
+            None,
+            breakpoint_obj.get('active', True),
+            breakpoint_obj.get('condition', None),
+            actual_locations))
+      kwargs = {
+          'breakpoints': breakpoints,
+          }
     elif response_command == 'changelive':
       response_type = ChangeSourceResponse
       kwargs = {
@@ -350,9 +446,18 @@ class V8DebuggerProtocol(DebuggerProtocol):
           }
     elif response_command == 'setbreakpoint':
       response_type = AddBreakpointResponse
-      # TODO(benvanik): extract 'actual_locations': ['column':, 'line':,]
+      body = body or {}
+      actual_locations = []
+      # Only script name breakpoints have a URI to report
+      script_name = body.get('script_name', None)
+      if script_name:
+        for location_obj in body.get('actual_locations', []):
+          actual_locations.append((script_name,
+                                   location_obj['line'] + 1,
+                                   location_obj['column'] + 1))
       kwargs = {
-          'protocol_id': body['breakpoint'],
+          'protocol_id': body.get('breakpoint', None),
+          'actual_locations': actual_locations,
           }
     response = response_type(*args, **kwargs)
 
@@ -424,6 +529,16 @@ class V8DebuggerProtocol(DebuggerProtocol):
           ref_obj['name'],
           ref_obj['inferredName'],
           location)
+    elif 'properties' in ref_obj:
+      # regexp/error/etc - treat as plain objects
+      handle = JSObject(
+          handle_id,
+          ref_obj.get('className', handle_type),
+          ref_obj['constructorFunction']['ref'],
+          ref_obj['prototypeObject']['ref'],
+          _parse_properties(ref_obj['properties']))
+    else:
+      handle = JSUnknown(handle_id, handle_type, ref_obj.get('text', None))
     handle_set.add_value(handle)
 
   def _parse_frame(self, frame_obj, handle_set):
@@ -501,6 +616,22 @@ class V8DebuggerProtocol(DebuggerProtocol):
     if self._exception_callback:
       self._exception_callback(event)
 
+  def _handle_after_compile_event(self, recv_obj):
+    """Handles a script compile event from the remote debugger.
+
+    Args:
+      recv_obj: JSON object from the packet.
+    """
+    body = recv_obj.get('body', None) or {}
+    uri = body.get('script', {}).get('name', None)
+    if not uri:
+      # Anonymous (eval/etc) - nothing can be waiting on it
+      return
+    print 'V8: incoming after compile event: %s' % (uri)
+    event = ScriptCompileEvent(self, uri)
+    if self._script_compile_callback:
+      self._script_compile_callback(event)
+
 
 class _V8ProtocolThread(threading.Thread):
   def __init__(self, protocol, socket, *args, **kwargs):
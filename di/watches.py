@@ -0,0 +1,208 @@
+# Copyright 2012 Google Inc. All Rights Reserved.
+
+__author__ = 'benvanik@google.com (Ben Vanik)'
+
+
+import json
+import os
+import sublime
+
+from .util import replace_file
+
+
+class WatchListener(object):
+  """Watch list event listener.
+  Receives watch event notifications.
+  """
+  def __init__(self, *args, **kwargs):
+    self._watch_list = None
+
+  def watch_list(self):
+    return self._watch_list
+
+  def on_watch_add(self, watch):
+    """Handles watch additions.
+
+    Args:
+      watch: Watch that was added.
+    """
+    pass
+
+  def on_watch_remove(self, watch):
+    """Handles watch removals.
+
+    Args:
+      watch: Watch that was removed.
+    """
+    pass
+
+
+class WatchList(object):
+  """A serializable list of watch expressions.
+  Like breakpoints, watches are retained across debugging sessions. They are
+  evaluated by each debugger whenever it pauses.
+  """
+  def __init__(self, listener, *args, **kwargs):
+    """Initializes a watch list.
+
+    Args:
+      listener: WatchListener to receive events.
+    """
+    self._listener = listener
+    self._listener._watch_list = self
+    self._is_dirty = True
+    self._save_pending = False
+    self._path = None
+    self._next_id = 0
+    self._watches = []
+    self._watches_by_id = {}
+
+  def watches(self):
+    """Gets all watches in display order.
+
+    Returns:
+      A list of Watches.
+    """
+    return self._watches[:]
+
+  def expressions(self):
+    """Gets the expressions of all watches in display order.
+
+    Returns:
+      A list of expression strings.
+    """
+    return [watch.expression() for watch in self._watches]
+
+  def _get_next_id(self):
+    """Gets the next ID that can be used for a watch.
+
+    Returns:
+      A string watch ID.
+    """
+    while True:
+      next_id = str(self._next_id)
+      self._next_id += 1
+      if not next_id in self._watches_by_id:
+        break
+    return next_id
+
+  def load(self, path):
+    """Loads the watch list.
+
+    Args:
+      path: Path to load from.
+    """
+    self._is_dirty = False
+    self._path = path
+    try:
+      with open(self._path, 'r') as f:
+        blob = json.loads(f.read())
+    except:
+      blob = {}
+    watch_objs = blob.get('watches', [])
+    for watch_obj in watch_objs:
+      watch = Watch(self, watch_obj['id'], watch_obj['expression'])
+      self._watches.append(watch)
+      self._watches_by_id[watch.id()] = watch
+
+  def save(self, path=None):
+    """Saves the watch list.
+
+    Args:
+      path: A new path to save to. Omit to use the past last loaded from.
+    """
+    self._save_pending = False
+    if not path and not self._path:
+      print 'STDI: no path specified for save'
+      return
+    if path:
+      self._path = path
+    if not self._is_dirty:
+      return
+    self._is_dirty = False
+    watch_objs = []
+    for watch in self._watches:
+      watch_objs.append({
+          'id': watch.id(),
+          'expression': watch.expression(),
+          })
+
+    temp_path = self._path + '.tmp'
+    with open(temp_path, 'w') as f:
+      f.write(json.dumps({
+          'watches': watch_objs,
+          }))
+      f.flush()
+      os.fsync(f.fileno())
+    replace_file(temp_path, self._path)
+
+  def create_watch(self, expression):
+    """Creates a new watch at the end of the list.
+
+    Args:
+      expression: Expression source.
+
+    Returns:
+      A new Watch.
+    """
+    watch = Watch(self, self._get_next_id(), expression)
+    self._watches.append(watch)
+    self._watches_by_id[watch.id()] = watch
+    self._invalidate()
+    self._listener.on_watch_add(watch)
+    return watch
+
+  def get_watch(self, watch_id):
+    """Gets a watch by ID.
+
+    Args:
+      watch_id: Watch ID.
+
+    Returns:
+      The Watch with the given ID, if it exists.
+    """
+    return self._watches_by_id.get(watch_id, None)
+
+  def remove_watch(self, watch):
+    """Removes the given watch.
+
+    Args:
+      watch: Watch.
+    """
+    if not watch.id() in self._watches_by_id:
+      return
+    self._watches.remove(watch)
+    del self._watches_by_id[watch.id()]
+    self._invalidate()
+    self._listener.on_watch_remove(watch)
+
+  def _invalidate(self):
+    """Marks the list as needing a save.
+    The list will be saved at some point in the future.
+    """
+    self._is_dirty = True
+    if not self._save_pending:
+      self._save_pending = True
+      sublime.set_timeout(lambda: self.save(), 0)
+
+
+class Watch(object):
+  """A watch expression.
+  """
+  def __init__(self, watch_list, watch_id, expression, *args, **kwargs):
+    """Initializes a watch.
+
+    Args:
+      watch_list: Watch list.
+      watch_id: Unique string ID.
+      expression: Expression source.
+    """
+    self._watch_list = watch_list
+    self._id = watch_id
+    self._expression = expression
+
+  def id(self):
+    return self._id
+
+  def expression(self):
+    return self._expression
@@ -3,7 +3,9 @@
 __author__ = 'benvanik@google.com (Ben Vanik)'
 
 
+import bisect
 import os
+import re
 import string
 import sublime
 import sublime_plugin
@@ -49,6 +51,8 @@ class DebugPlugin(object):
     self._providers = {}
     # Active debuggers, mapped by instance URI
     self._debuggers = {}
+    # URIs of all instances attached to since startup, to detect reattaches
+    self._attached_instance_uris = set()
     # The debugger for each provider, mapped by provider URI
     # TODO(benvanik): remove this - it limits things to one active session
     self._debuggers_by_provider = {}
@@ -62,20 +66,41 @@ class DebugPlugin(object):
     self._breakpoint_list = di.load_breakpoint_list(breakpoint_file,
                                                     self._breakpoint_listener)
 
+    # Watch list, saved alongside the breakpoints
+    watch_file = os.path.join(os.path.dirname(breakpoint_file),
+                              'Watches.sublime_session')
+    self._watch_listener = WatchListener(self)
+    self._watch_list = di.load_watch_list(watch_file, self._watch_listener)
+
     # Status manager
     self._status_manager = StatusManager(self)
 
+    # Value tooltips for identifiers under the caret
+    self._hover_evaluator = HoverEvaluator(self)
+
+    # Maps target URIs to local paths, configured when attaching
+    self._path_mapper = di.PathMapper()
+
+    # Source maps of generated scripts, loaded on demand
+    self._source_map_cache = di.SourceMapCache(
+        resolve_path=self.translate_uri)
+
     # Active location, if one is set
     self._active_location = None
 
-    # All source views that exist, by view.id()
+    # Source views, by view.id()
+    # Only views showing files with breakpoints or the active location are
+    # wrapped, on demand
     self._source_views = {}
+    # Open ST views by normalized file name, and the normalized file name each
+    # was indexed under
+    self._views_by_path = {}
+    self._view_paths = {}
 
-    # Scan all open views to build source views
-    # TODO(benvanik): find a way to prevent this
+    # Index the views that were opened before the plugin loaded
     for window in sublime.windows():
       for view in window.views():
-        self.get_source_view(view)
+        self.index_view(view)
 
   def debuggers(self):
     return self._debuggers.values()
@@ -83,9 +108,18 @@ class DebugPlugin(object):
   def breakpoint_list(self):
     return self._breakpoint_list
 
+  def watch_list(self):
+    return self._watch_list
+
   def status_manager(self):
     return self._status_manager
 
+  def hover_evaluator(self):
+    return self._hover_evaluator
+
+  def source_map_cache(self):
+    return self._source_map_cache
+
   def show_status_message(self, value):
     """Shows a status message.
 
@@ -173,9 +207,16 @@ class DebugPlugin(object):
 
     # Create
     provider = instance_info.provider()
-    listener = DebuggerListener(self)
+    is_reattach = instance_info.uri() in self._attached_instance_uris
+    self._attached_instance_uris.add(instance_info.uri())
+    listener = DebuggerListener(self, is_reattach=is_reattach)
     debugger = instance_info.attach_debugger(listener)
     debugger.set_target_window(target_window)
+    self._configure_path_mapper(target_window)
+    debugger.set_path_mapper(self._path_mapper)
+    debugger.set_source_map_cache(self._source_map_cache)
+    debugger.set_exception_break_mode(
+        self._breakpoint_list.exception_break_mode())
     self._debuggers[instance_info.uri()] = debugger
     self._debuggers_by_provider[provider.uri()] = debugger
     debugger.attach()
@@ -223,17 +264,35 @@ class DebugPlugin(object):
     del self._debuggers_by_provider[provider_uri]
     self._status_manager.update()
 
+  def _configure_path_mapper(self, window):
+    """Updates the path mapper from the settings of the given window.
+    Mappings are read from the 'debug_path_mappings' setting, a dict of
+    target path prefixes to local path prefixes. Files not covered by a
+    mapping are searched for in the project folders.
+
+    Args:
+      window: Target window.
+    """
+    view = window.active_view()
+    rules = view.settings().get('debug_path_mappings', None) if view else None
+    search_paths = window.folders()
+    if self._path_mapper.is_equivalent(rules, search_paths):
+      return
+    self._path_mapper = di.PathMapper(rules, search_paths)
+    # Maps were found through the old paths
+    self._source_map_cache.clear()
+
   def translate_uri(self, uri):
     """Translates a URI to a source path.
+    Source maps are applied to locations, not URIs - see source_map_cache().
 
     Args:
       uri: URI.
 
     Returns:
-      A source path that can be used with ST or None if no mapping exists.
+      A source path that can be used with ST, or the URI if no mapping exists.
     """
-    # TODO(benvanik): translate uri (source map/etc)
-    return uri
+    return self._path_mapper.to_local(uri)
 
   def get_source_view(self, view, create=True):
     """Gets a SourceView for the given ST view.
@@ -249,18 +308,70 @@ class DebugPlugin(object):
     if not source_view and create:
       source_view = SourceView(self, view)
       self._source_views[view.id()] = source_view
+      if not view.is_loading():
+        source_view.update_breakpoints()
     return source_view
 
+  def index_view(self, view):
+    """Updates the file name an ST view is indexed under.
+    This must be called whenever the file name of a view may have changed, such
+    as after loading, saving or activation. Views showing a file with
+    breakpoints are wrapped in a SourceView, and existing source views of
+    renamed files are redrawn.
+
+    Args:
+      view: ST view.
+    """
+    view_id = view.id()
+    old_path = self._view_paths.get(view_id, None)
+    file_name = view.file_name()
+    new_path = None
+    if file_name:
+      new_path = di.paths.normalize_uri(file_name)
+    if old_path == new_path:
+      return
+    if old_path:
+      self._unindex_view(view)
+    if new_path:
+      self._views_by_path.setdefault(new_path, []).append(view)
+      self._view_paths[view_id] = new_path
+    source_view = self.get_source_view(view, create=False)
+    if source_view:
+      # Renamed - show the breakpoints of the new file instead
+      if not view.is_loading():
+        source_view.update_breakpoints()
+    elif file_name and self._breakpoint_list.has_breakpoints_in_file(file_name):
+      self.get_source_view(view)
+
+  def _unindex_view(self, view):
+    """Removes an ST view from the file name index.
+
+    Args:
+      view: ST view.
+    """
+    path = self._view_paths.pop(view.id(), None)
+    if not path:
+      return
+    views = self._views_by_path[path]
+    for n in range(len(views)):
+      if views[n].id() == view.id():
+        del views[n]
+        break
+    if not len(views):
+      del self._views_by_path[path]
+
   def source_views_for_uri(self, uri):
     """Iterates all source views with the given URI.
+    Source views are created for any open views of the file that do not yet
+    have one.
 
     Args:
       uri: URI.
     """
-    translated_path = self.translate_uri(uri)
-    for source_view in self._source_views.values():
-      if source_view.file_name() == translated_path:
-        yield source_view
+    translated_path = di.paths.normalize_uri(self.translate_uri(uri))
+    views = self._views_by_path.get(translated_path, [])
+    for view in views[:]:
+      yield self.get_source_view(view)
 
   def cleanup_source_view(self, view):
     """Removes a SourceView for the given ST view.
@@ -268,6 +379,7 @@ class DebugPlugin(object):
     Args:
       view: ST view.
     """
+    self._unindex_view(view)
     source_view = self._source_views.get(view.id(), None)
     if source_view:
       source_view.cleanup()
@@ -287,23 +399,24 @@ class DebugPlugin(object):
       self.clear_active_location()
       return
     (uri, line, column) = location
+    old_location = self._active_location
     self._active_location = (uri, line, column)
     translated_path = self.translate_uri(uri)
     full_path = '%s:%s:%s' % (translated_path, line, column)
     window = debugger.target_window()
     new_view = window.open_file(full_path, sublime.ENCODED_POSITION |
                                            0)#sublime.TRANSIENT)
+    self.index_view(new_view)
     new_view = self.get_source_view(new_view)
     if not new_view.is_loading():
       window.focus_view(new_view.view())
 
-    # Enumerate all views we know about and update them
-    # TODO(benvanik): faster - lookup by filename
-    for source_view in self._source_views.values():
-      if source_view.file_name() == translated_path:
-        source_view.set_active_location(location)
-      else:
+    # Only the views of the previous and new active files need updating
+    if old_location:
+      for source_view in self.source_views_for_uri(old_location[0]):
         source_view.clear_active_location()
+    for source_view in self.source_views_for_uri(uri):
+      source_view.set_active_location(location)
 
   def clear_active_location(self):
     """Clears the active location.
@@ -376,6 +489,215 @@ class StatusManager(object):
     view.set_status('stdi', message)
 
 
+# Identifiers (with member access) that can be evaluated for hover values
+_HOVER_EXPRESSION_RE = re.compile(r'[A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)*')
+# Words that look like identifiers but have no useful value
+_HOVER_KEYWORDS = frozenset([
+    'break', 'case', 'catch', 'continue', 'debugger', 'default', 'delete',
+    'do', 'else', 'false', 'finally', 'for', 'function', 'if', 'in',
+    'instanceof', 'new', 'null', 'return', 'switch', 'throw', 'true', 'try',
+    'typeof', 'var', 'void', 'while', 'with',
+    ])
+
+
+class HoverEvaluator(object):
+  """Shows the values of identifiers under the caret while paused.
+  Evaluation is debounced so that moving the caret quickly does not flood the
+  target, results are cached per pause epoch and frame, and a pending request
+  is cancelled as soon as the caret leaves its identifier.
+
+  Values are shown in the status bar and in the auto complete popup.
+  """
+  # Milliseconds the caret must rest on an identifier before evaluating
+  DEBOUNCE_DELAY = 250
+
+  def __init__(self, plugin, *args, **kwargs):
+    """Initializes a hover evaluator.
+
+    Args:
+      plugin: Parent plugin.
+    """
+    self._plugin = plugin
+    # Incremented on every caret move to invalidate debounced evaluations
+    self._generation = 0
+    # Cached display values, mapped by (frame ordinal, expression)
+    self._cache = {}
+    self._cache_debugger = None
+    self._cache_epoch = None
+    # (debugger, request ID, key) of the evaluation in flight, if any
+    self._pending = None
+    # Key of the value currently shown, if any
+    self._shown_key = None
+    # Completions to return from the next on_query_completions, by view.id()
+    self._completions = {}
+
+  def _get_cache(self, debugger):
+    """Gets the value cache for the current pause of the given debugger.
+
+    Args:
+      debugger: Debugger.
+
+    Returns:
+      A dict of (frame ordinal, expression) -> display value.
+    """
+    epoch = debugger.pause_epoch()
+    if self._cache_debugger != debugger or self._cache_epoch != epoch:
+      self._cache = {}
+      self._cache_debugger = debugger
+      self._cache_epoch = epoch
+    return self._cache
+
+  def _get_expression_at_caret(self, view):
+    """Gets the expression under the caret of the given view.
+    Member accesses are included up to the identifier under the caret, so
+    'a.b.c' with the caret on 'b' yields 'a.b'.
+
+    Args:
+      view: ST view.
+
+    Returns:
+      An expression string, or None if the caret is not on an identifier.
+    """
+    sel = view.sel()
+    if len(sel) != 1 or not sel[0].empty():
+      return None
+    point = sel[0].b
+    scope = view.scope_name(point)
+    if 'comment' in scope or 'string' in scope:
+      return None
+    line = view.line(point)
+    column = point - line.begin()
+    for match in _HOVER_EXPRESSION_RE.finditer(view.substr(line)):
+      if match.start() > column:
+        break
+      if match.end() < column:
+        continue
+      end = match.group(0).find('.', column - match.start())
+      if end == -1:
+        expression = match.group(0)
+      else:
+        expression = match.group(0)[:end]
+      if expression in _HOVER_KEYWORDS:
+        return None
+      return expression
+    return None
+
+  def _cancel_pending(self):
+    """Cancels the evaluation in flight, if any.
+    """
+    if self._pending:
+      (debugger, request_id, key) = self._pending
+      debugger.cancel_request(request_id)
+      self._pending = None
+
+  def on_selection_modified(self, view):
+    """Handles caret movement in a source view.
+
+    Args:
+      view: ST view.
+    """
+    self._generation += 1
+    debugger = self._plugin.get_debugger_for_view(view)
+    if not debugger or debugger.is_running():
+      self._cancel_pending()
+      self._hide(view)
+      return
+    frame = debugger.listener().selected_frame()
+    expression = self._get_expression_at_caret(view)
+    if not frame or not expression:
+      self._cancel_pending()
+      self._hide(view)
+      return
+    key = (frame.ordinal(), expression)
+    if key == self._shown_key:
+      return
+    self._hide(view)
+    if self._pending and self._pending[2] != key:
+      # The caret has left the identifier being evaluated
+      self._cancel_pending()
+
+    cache = self._get_cache(debugger)
+    if key in cache:
+      self._show(view, key, cache[key])
+      return
+    if self._pending:
+      return
+    generation = self._generation
+    def _debounced():
+      if generation == self._generation:
+        self._evaluate(view, debugger, frame, key)
+    sublime.set_timeout(_debounced, self.DEBOUNCE_DELAY)
+
+  def _evaluate(self, view, debugger, frame, key):
+    """Evaluates an expression and shows its value when it arrives.
+
+    Args:
+      view: ST view.
+      debugger: Debugger.
+      frame: Frame to evaluate in.
+      key: (frame ordinal, expression) key.
+    """
+    epoch = debugger.pause_epoch()
+    generation = self._generation
+    def _on_evaluate(response):
+      self._pending = None
+      if debugger.pause_epoch() != epoch or debugger.is_running():
+        return
+      value = None
+      if response.is_success() and response.value():
+        value = _format_evaluate_response(response)
+      self._get_cache(debugger)[key] = value
+      if generation == self._generation:
+        self._show(view, key, value)
+    request_id = debugger.evaluate(key[1], _on_evaluate, frame=frame)
+    if request_id is not None:
+      self._pending = (debugger, request_id, key)
+
+  def _show(self, view, key, value):
+    """Shows a value for the given key.
+
+    Args:
+      view: ST view.
+      key: (frame ordinal, expression) key.
+      value: Display value, or None if the expression had no value.
+    """
+    if not value:
+      return
+    self._shown_key = key
+    text = '%s = %s' % (key[1], value)
+    self._plugin.show_status_message(text)
+    self._completions[view.id()] = [(text, key[1])]
+    view.run_command('auto_complete', {
+        'disable_auto_insert': True,
+        'api_completions_only': True,
+        'next_completion_if_showing': False,
+        'auto_complete_commit_on_tab': True,
+        })
+
+  def _hide(self, view):
+    """Hides the value being shown, if any.
+
+    Args:
+      view: ST view.
+    """
+    if not self._shown_key:
+      return
+    self._shown_key = None
+    view.run_command('hide_auto_complete')
+
+  def query_completions(self, view):
+    """Gets the value completions that should be shown in the given view.
+    Completions are only returned once, in response to the popup being shown.
+
+    Args:
+      view: ST view.
+
+    Returns:
+      A list of (trigger, contents) completions, or None.
+    """
+    return self._completions.pop(view.id(), None)
+
+
 class SourceView(object):
   """A ST view wrapper that manages a single views overlays and state.
   A DebugPlugin will manage these views, creating and deleting them as required,
@@ -383,7 +705,26 @@ class SourceView(object):
   view.
 
   This type uses metaprogramming to make it act like an ST view (mostly).
+
+  Breakpoint lines are tracked across edits with a hidden region set, kept in
+  buffer order with a parallel list of breakpoint IDs. When the file is saved
+  the tracked lines are compared with the breakpoint locations to find the
+  breakpoints that moved.
+
+  Breakpoints are drawn with one region set per style, recomputed from the
+  breakpoint list on the next tick after any change.
   """
+  # Region key of the hidden breakpoint tracking regions
+  _TRACKING_KEY = 'stdi_view_breakpoint_tracking'
+
+  # Breakpoint styles as (name, scope, icon), in order of precedence
+  _BREAKPOINT_STYLES = [
+      ('disabled', 'stdi.gutter.breakpoint.disabled', 'circle'),
+      ('unresolved', 'stdi.gutter.breakpoint.unresolved', 'cross'),
+      ('conditional', 'stdi.gutter.breakpoint.conditional', 'bookmark'),
+      ('enabled', 'stdi.gutter.breakpoint', 'dot'),
+      ]
+
   def __init__(self, plugin, view, *args, **kwargs):
     """Initializes a source view.
 
@@ -394,7 +735,15 @@ class SourceView(object):
     self._plugin = plugin
     self._view = view
     self._active_location = None
-    self._breakpoint_regions = {}
+    # True if a redraw of the breakpoints is queued
+    self._render_pending = False
+    self._is_disposed = False
+    # Breakpoint IDs in the same order as the tracking regions
+    self._tracked_ids = []
+    # Lines breakpoints were bound to by a debugger, by Breakpoint.id(), only
+    # for those bound away from their own line. None if the breakpoint did not
+    # resolve to any code
+    self._resolved_lines = {}
 
   def __getattr__(self, name):
     if hasattr(self._view, name):
@@ -407,13 +756,16 @@ class SourceView(object):
   def cleanup(self):
     """Called before the view is disposed to cleanup all changes.
     """
+    self._is_disposed = True
     self.erase_regions('stdi_view_active')
-    for key in self._breakpoint_regions.values():
-      self.erase_regions(key)
+    self.erase_regions(self._TRACKING_KEY)
+    for (name, scope, icon) in self._BREAKPOINT_STYLES:
+      self.erase_regions('stdi_view_breakpoints_%s' % (name))
 
   def on_load(self):
     """Called once the view has loaded.
     """
+    self.update_breakpoints()
     self.set_active_location(self._active_location)
     if self._active_location:
       self.window().focus_view(self._view)
@@ -429,8 +781,8 @@ class SourceView(object):
       A sublime.Region.
     """
     (uri, line, column) = location
-    self._active_location = (uri, line, column)
-    point = self.text_point(line - 1, column - 1)
+    # Column 0 means the entire line
+    point = self.text_point(line - 1, max(column - 1, 0))
     return self.line(point)
 
   def active_location(self):
@@ -441,6 +793,7 @@ class SourceView(object):
     if not location:
       return
     region = self.location_to_region(location)
+    self._active_location = location
 
     # Pick based on breakpoint/exception/etc
     # TODO(benvanik): pick icon/style
@@ -460,39 +813,220 @@ class SourceView(object):
     self.erase_regions('stdi_view_active')
     self._active_location = None
 
+  def update_breakpoints(self):
+    """Redraws all breakpoints in the file shown by this view.
+    Any line changes tracked since the last save are discarded.
+    """
+    self._tracked_ids = []
+    self._resolved_lines = {}
+    file_name = self.file_name()
+    breakpoints = []
+    if file_name:
+      breakpoint_list = self._plugin.breakpoint_list()
+      breakpoints = breakpoint_list.get_breakpoints_in_file(file_name)
+    # Breakpoints come back sorted by line, so the tracking regions can be
+    # built directly
+    tracking_regions = []
+    for breakpoint in breakpoints:
+      tracking_regions.append(self.location_to_region(breakpoint.location()))
+      self._tracked_ids.append(breakpoint.id())
+    self.add_regions(self._TRACKING_KEY,
+                     tracking_regions,
+                     '',
+                     '',
+                     sublime.HIDDEN)
+    self._invalidate_breakpoints()
+
+  def _get_tracked_region(self, breakpoint):
+    """Gets the current region of a tracked breakpoint.
+
+    Args:
+      breakpoint: Breakpoint.
+
+    Returns:
+      A sublime.Region, or None if the breakpoint is not tracked.
+    """
+    if not breakpoint.id() in self._tracked_ids:
+      return None
+    index = self._tracked_ids.index(breakpoint.id())
+    return self.get_regions(self._TRACKING_KEY)[index]
+
+  def _invalidate_breakpoints(self):
+    """Queues a redraw of all breakpoints for the next tick.
+    Any number of changes made before then are drawn together.
+    """
+    if not self._render_pending:
+      self._render_pending = True
+      sublime.set_timeout(lambda: self._render_breakpoints(), 0)
+
+  def _get_breakpoint_style(self, breakpoint):
+    """Picks the style a breakpoint is drawn with.
+
+    Args:
+      breakpoint: Breakpoint.
+
+    Returns:
+      A style name from _BREAKPOINT_STYLES.
+    """
+    if not breakpoint.is_enabled():
+      return 'disabled'
+    elif (breakpoint.id() in self._resolved_lines and
+          not self._resolved_lines[breakpoint.id()]):
+      return 'unresolved'
+    elif breakpoint.condition():
+      return 'conditional'
+    else:
+      return 'enabled'
+
+  def _render_breakpoints(self):
+    """Draws all breakpoints in the file with one region set per style.
+    Breakpoints are drawn where they are tracked, which may differ from their
+    location if the file has been edited since it was saved, or on the line a
+    debugger bound them to.
+    """
+    self._render_pending = False
+    if self._is_disposed:
+      return
+    tracking_regions = self.get_regions(self._TRACKING_KEY)
+    tracked_regions = {}
+    for n in range(len(tracking_regions)):
+      tracked_regions[self._tracked_ids[n]] = tracking_regions[n]
+
+    style_regions = {}
+    for (name, scope, icon) in self._BREAKPOINT_STYLES:
+      style_regions[name] = []
+    file_name = self.file_name()
+    if file_name:
+      breakpoint_list = self._plugin.breakpoint_list()
+      for breakpoint in breakpoint_list.get_breakpoints_in_file(file_name):
+        resolved_line = self._resolved_lines.get(breakpoint.id(), None)
+        if resolved_line:
+          region = self.line(self.text_point(resolved_line - 1, 0))
+        else:
+          region = tracked_regions.get(breakpoint.id(), None)
+          if not region:
+            region = self.location_to_region(breakpoint.location())
+        style_regions[self._get_breakpoint_style(breakpoint)].append(region)
+
+    for (name, scope, icon) in self._BREAKPOINT_STYLES:
+      key = 'stdi_view_breakpoints_%s' % (name)
+      if len(style_regions[name]):
+        self.add_regions(key,
+                         style_regions[name],
+                         scope,
+                         icon,
+                         sublime.HIDDEN)
+      else:
+        self.erase_regions(key)
+
   def add_breakpoint(self, breakpoint):
+    # Source views created for the breakpoint already track it
+    if breakpoint.id() in self._tracked_ids:
+      return
     location = breakpoint.location()
     region = self.location_to_region(location)
 
-    # TODO(benvanik): pick icon/style
-    scope = 'stdi.gutter.breakpoint'
-    icon = 'dot'
-
-    key = 'stdi_view_breakpoint_%s' % (breakpoint.id())
-    self.add_regions(key,
-                     [region],
-                     scope,
-                     icon,
+    # Insert in buffer order, keeping any tracked edits to other breakpoints
+    tracking_regions = self.get_regions(self._TRACKING_KEY)
+    starts = [tracking_region.begin() for tracking_region in tracking_regions]
+    index = bisect.bisect_right(starts, region.begin())
+    tracking_regions.insert(index, region)
+    self._tracked_ids.insert(index, breakpoint.id())
+    self.add_regions(self._TRACKING_KEY,
+                     tracking_regions,
+                     '',
+                     '',
                      sublime.HIDDEN)
 
-    self._breakpoint_regions[breakpoint.id()] = key
+    self._invalidate_breakpoints()
 
   def change_breakpoint(self, breakpoint):
-    # Easy!
-    self.remove_breakpoint(breakpoint)
-    self.add_breakpoint(breakpoint)
+    self._invalidate_breakpoints()
 
-  def remove_breakpoint(self, breakpoint):
-    key = self._breakpoint_regions.get(breakpoint.id(), None)
-    if not key:
+  def resolve_breakpoint(self, breakpoint, location):
+    """Shows where a debugger bound a breakpoint.
+    The breakpoints are only redrawn if it was bound to another line than the
+    one it is drawn on.
+
+    Args:
+      breakpoint: Breakpoint.
+      location: (uri, line, column) location the breakpoint was bound to, or
+                None if it did not resolve to any code.
+    """
+    region = self._get_tracked_region(breakpoint)
+    if not region:
       return
-    self.erase_regions(key)
-    del self._breakpoint_regions[breakpoint.id()]
+    line = self.rowcol(region.begin())[0] + 1
+    if location and location[1] == line:
+      if not breakpoint.id() in self._resolved_lines:
+        return
+      del self._resolved_lines[breakpoint.id()]
+    else:
+      resolved_line = None
+      if location:
+        resolved_line = location[1]
+      if (breakpoint.id() in self._resolved_lines and
+          self._resolved_lines[breakpoint.id()] == resolved_line):
+        return
+      self._resolved_lines[breakpoint.id()] = resolved_line
+    self._invalidate_breakpoints()
+
+  def clear_breakpoint_resolution(self, breakpoint):
+    """Draws a breakpoint at its own line again, such as after detaching.
+
+    Args:
+      breakpoint: Breakpoint.
+    """
+    if not breakpoint.id() in self._resolved_lines:
+      return
+    del self._resolved_lines[breakpoint.id()]
+    self._invalidate_breakpoints()
+
+  def remove_breakpoint(self, breakpoint):
+    self._resolved_lines.pop(breakpoint.id(), None)
+    if breakpoint.id() in self._tracked_ids:
+      index = self._tracked_ids.index(breakpoint.id())
+      tracking_regions = self.get_regions(self._TRACKING_KEY)
+      del tracking_regions[index]
+      del self._tracked_ids[index]
+      self.add_regions(self._TRACKING_KEY,
+                       tracking_regions,
+                       '',
+                       '',
+                       sublime.HIDDEN)
+    self._invalidate_breakpoints()
+
+  def get_breakpoint_moves(self):
+    """Finds all tracked breakpoints whose lines have changed.
+    This should be called after the file is saved.
+
+    Returns:
+      A list of (Breakpoint, (uri, line, column)) tuples with the new
+      locations of all breakpoints that moved.
+    """
+    breakpoint_list = self._plugin.breakpoint_list()
+    tracking_regions = self.get_regions(self._TRACKING_KEY)
+    moves = []
+    for n in range(len(tracking_regions)):
+      breakpoint = breakpoint_list.get_breakpoint(self._tracked_ids[n])
+      if not breakpoint:
+        continue
+      (uri, line, column) = breakpoint.location()
+      new_line = self.rowcol(tracking_regions[n].begin())[0] + 1
+      if new_line != line:
+        moves.append((breakpoint, (uri, new_line, column)))
+    return moves
 
 
 class CallstackView(views.CustomView):
   """A view that models a callstack, displaying and handling frame navigation.
+  The view text and regions are built up front and applied with a single
+  insert, and only the first frames of deep stacks are shown until more are
+  requested. Clicking a frame selects it in the debugger listener.
   """
+  # Number of frames shown initially and added by each 'load more' click
+  _FRAME_PAGE_SIZE = 64
+
   def __init__(self, window, debugger, *args, **kwargs):
     """Initializes a callstack view.
 
@@ -506,41 +1040,104 @@ class CallstackView(views.CustomView):
       window.set_view_index(self._view, 2, 0)
     elif window.num_groups() > 1:
       window.set_view_index(self._view, 1, 0)
+    self._snapshot = None
+    self._frame_limit = self._FRAME_PAGE_SIZE
+    # Index of the selected frame in the snapshot
+    self._selected_index = 0
+    # Regions of the visible frames, and their start points for hit testing
+    self._frame_regions = []
+    self._frame_starts = []
+
+  def clear(self):
+    self._snapshot = None
+    self._frame_regions = []
+    self._frame_starts = []
+    self.view().erase_regions('stdi_callstack_load_more')
+    super(CallstackView, self).clear()
 
   def update(self, snapshot):
+    if snapshot != self._snapshot:
+      self._snapshot = snapshot
+      self._frame_limit = self._FRAME_PAGE_SIZE
+      self._selected_index = 0
+    self._render()
+
+  def set_selected_frame(self, frame):
+    """Marks the given frame as selected.
+
+    Args:
+      frame: Frame from the current snapshot.
+    """
+    if not self._snapshot:
+      return
+    self._selected_index = self._snapshot.frames().index(frame)
+    if self._selected_index >= self._frame_limit:
+      self._frame_limit = self._selected_index + 1
+      self._render()
+    else:
+      self._mark_selected_frame()
+
+  def _mark_selected_frame(self):
+    """Updates the region marking the selected frame.
+    """
     view = self.view()
-    view.set_read_only(False)
-    edit = view.begin_edit()
-    view.erase(edit, sublime.Region(0, view.size()))
+    if self._selected_index < len(self._frame_regions):
+      view.add_regions(
+          'stdi_callstack_active_frame',
+          [self._frame_regions[self._selected_index]],
+          'stdi.callstack.active_frame',
+          'dot',
+          sublime.HIDDEN)
+    else:
+      view.erase_regions('stdi_callstack_active_frame')
+
+  def _render(self):
+    """Redraws the visible frames of the current snapshot.
+    """
+    snapshot = self._snapshot
+    frames = snapshot.frames()
+    handle_set = snapshot.handle_set()
+
+    lines = []
+    point = 0
     frame_regions = []
     frame_info_regions = []
     source_info_regions = []
-
-    handle_set = snapshot.handle_set()
-    for frame in snapshot.frames():
+    for frame in frames[:self._frame_limit]:
       location = frame.location()
 
       s = '%s: %s' % (frame.ordinal(), frame.formatted_call(handle_set))
       s = string.ljust(s, 120) + '\n'
-      view.insert(edit, view.size(), s)
-      frame_info_region = view.line(view.size() - 2)
+      lines.append(s)
+      frame_info_region = sublime.Region(point, point + len(s) - 1)
       frame_info_regions.append(frame_info_region)
+      point += len(s)
 
       s = '    %s@%s:%s\n' % (location[0], location[1], location[2])
-      view.insert(edit, view.size(), s)
-      source_info_region = view.line(view.size() - 2)
+      lines.append(s)
+      source_info_region = sublime.Region(point, point + len(s) - 1)
       source_info_regions.append(source_info_region)
+      point += len(s)
 
       frame_regions.append(sublime.Region(frame_info_region.begin(),
                                           source_info_region.end()))
 
-      # print '  is_constructor: %s' % (frame.is_constructor())
-      # print '  is_at_return: %s' % (frame.is_at_return())
-      # print '  function: %s' % (handle_set.get_value(frame.function_ref()))
-      # print '  this: %s' % (handle_set.get_value(frame.this_ref()))
-      # print '  arguments:'
-      # for var in frame.argument_refs():
-      #   print '    %s = %s' % (var[0], handle_set.get_value(var[1]))
+    load_more_regions = []
+    remaining = len(frames) - self._frame_limit
+    if remaining > 0:
+      s = '... %s more frames (click to load more)\n' % (remaining)
+      lines.append(s)
+      load_more_regions.append(sublime.Region(point, point + len(s) - 1))
+
+    self._frame_regions = frame_regions
+    self._frame_starts = [region.begin() for region in frame_regions]
+
+    view = self.view()
+    view.sel().clear()
+    view.set_read_only(False)
+    edit = view.begin_edit()
+    view.erase(edit, sublime.Region(0, view.size()))
+    view.insert(edit, 0, ''.join(lines))
 
     # Mark info regions
     view.add_regions(
@@ -554,24 +1151,173 @@ class CallstackView(views.CustomView):
         source_info_regions,
         'comment') #'stdi.callstack.source_info',
 
-    # Mark active frame
-    scope = 'stdi.gutter.breakpoint'
-    icon = 'dot'
+    # Mark the line that loads more frames
     view.add_regions(
-        'stdi_callstack_active_frame',
-        [frame_regions[0]],
-        'stdi.callstack.active_frame',
-        'dot',
-        sublime.HIDDEN)
+        'stdi_callstack_load_more',
+        load_more_regions,
+        'comment')
+
+    # Mark active frame
+    self._mark_selected_frame()
 
     view.end_edit(edit)
     view.set_read_only(True)
 
+  def on_selection_modified(self):
+    if not self._snapshot:
+      return
+    view = self.view()
+    point = None
+    for region in view.sel():
+      point = region.begin()
+      break
+    if point is None:
+      return
+    for region in view.get_regions('stdi_callstack_load_more'):
+      if region.contains(point):
+        view.sel().clear()
+        self._frame_limit += self._FRAME_PAGE_SIZE
+        self._render()
+        return
+    index = bisect.bisect_right(self._frame_starts, point) - 1
+    if index >= 0 and self._frame_regions[index].contains(point):
+      view.sel().clear()
+      frame = self._snapshot.frames()[index]
+      self.debugger().listener().select_frame(frame)
+
+
+def _format_evaluate_response(response):
+  """Formats the result of an evaluation for display.
+
+  Args:
+    response: EvaluateResponse.
+
+  Returns:
+    A single-line string describing the value or error.
+  """
+  if not response:
+    return '<not evaluated>'
+  if not response.is_success() or not response.value():
+    return '<error: %s>' % (response.error_message() or 'unknown')
+  return str(response.value()).replace('\n', ' ')
+
+
+class WatchView(views.CustomView):
+  """A view that displays watch expression values.
+  Values are diffed against the previous pause so that only rows that changed
+  are rewritten and highlighted.
+  """
+  def __init__(self, window, debugger, *args, **kwargs):
+    """Initializes a watch view.
+
+    Args:
+      window: Target sublime window.
+      debugger: Debugger.
+    """
+    super(WatchView, self).__init__(window, debugger, 'Watches',
+                                    *args, **kwargs)
+    if window.num_groups() == 4:
+      window.set_view_index(self._view, 3, 0)
+    elif window.num_groups() > 1:
+      window.set_view_index(self._view, 1, 0)
+    # Displayed rows as (watch ID, text), in display order
+    self._rows = []
+
+  def clear(self):
+    self._rows = []
+    super(WatchView, self).clear()
+
+  def update(self, watches, responses):
+    """Updates the view with new watch values.
+
+    Args:
+      watches: A list of Watches, in display order.
+      responses: A list of EvaluateResponses matching the watches.
+    """
+    rows = []
+    for n in range(len(watches)):
+      rows.append((watches[n].id(), '%s: %s' % (
+          watches[n].expression(), _format_evaluate_response(responses[n]))))
+
+    view = self.view()
+    view.set_read_only(False)
+    edit = view.begin_edit()
+    changed_regions = []
+    if [row[0] for row in rows] == [row[0] for row in self._rows]:
+      # Same watches - only replace the rows that changed
+      point = 0
+      for n in range(len(rows)):
+        old_text = self._rows[n][1]
+        new_text = rows[n][1]
+        if old_text != new_text:
+          view.replace(edit, sublime.Region(point, point + len(old_text)),
+                       new_text)
+          changed_regions.append(
+              sublime.Region(point, point + len(new_text)))
+        point += len(new_text) + 1
+    else:
+      # Watches were added or removed - rewrite everything
+      old_texts = dict(self._rows)
+      view.erase(edit, sublime.Region(0, view.size()))
+      view.insert(edit, 0, ''.join(['%s\n' % (row[1]) for row in rows]))
+      point = 0
+      for (watch_id, text) in rows:
+        if watch_id in old_texts and old_texts[watch_id] != text:
+          changed_regions.append(sublime.Region(point, point + len(text)))
+        point += len(text) + 1
+    view.add_regions(
+        'stdi_watch_changed',
+        changed_regions,
+        'markup.changed') #'stdi.watch.changed',
+    view.end_edit(edit)
+    view.set_read_only(True)
+    self._rows = rows
+
+
+def _expand_breadth_first(debugger, nodes, select_nodes, callback):
+  """Expands variable nodes breadth-first with one batched lookup per depth.
+  Nodes are expanded without updating the view.
+
+  Args:
+    debugger: Debugger.
+    nodes: _VariableNodes at the first depth.
+    select_nodes: Function called with the nodes at each depth, returning the
+                  ones to expand. Returning none of them ends the walk.
+    callback: Function called when the walk has ended.
+  """
+  def _expand_depth(nodes):
+    nodes = select_nodes(nodes)
+    if not len(nodes):
+      callback()
+      return
+    # Nodes expanded before already have their children
+    handle_ids = set()
+    for node in nodes:
+      if node.child_nodes() is None:
+        handle_ids.update(node.child_handle_ids())
+    def _on_query_values(handle_set):
+      child_nodes = []
+      for node in nodes:
+        node_children = node.child_nodes()
+        if node_children is None:
+          node_children = node.create_children(handle_set)
+        node._expand_with(node_children)
+        child_nodes.extend(node_children)
+      _expand_depth(child_nodes)
+    if len(handle_ids):
+      debugger.query_values(list(handle_ids), _on_query_values)
+    else:
+      _on_query_values(None)
+  _expand_depth(nodes)
+
 
 class _VariableNode(views.TreeNode):
-  def __init__(self, view, debugger, handle_set, key, value, *args, **kwargs):
+  def __init__(self, view, debugger, parent, handle_set, key, value,
+               *args, **kwargs):
     super(_VariableNode, self).__init__(view, *args, **kwargs)
     self._debugger = debugger
+    self._parent = parent
+    self._expanded_paths = parent.expanded_paths()
     self._handle_set = handle_set
     self._key = key
     self._value = value
@@ -580,6 +1326,12 @@ class _VariableNode(views.TreeNode):
   def label(self):
     return self._key
 
+  def value(self):
+    return self._value
+
+  def parent(self):
+    return self._parent
+
   def description(self):
     return str(self._value)
 
@@ -587,25 +1339,66 @@ class _VariableNode(views.TreeNode):
     return (self._value.handle_type() == 'object' or
             self._value.handle_type() == 'function')
 
-  def query_children(self, callback):
-    handle_ids = []
+  def expanded_paths(self):
+    return self._expanded_paths
+
+  def path(self):
+    """Gets the path of the node, used to remember its expansion across pauses.
+
+    Returns:
+      A tuple of the scope name and property names leading to the node.
+    """
+    path = []
+    node = self
+    while isinstance(node, _VariableNode):
+      path.append(node._key)
+      node = node._parent
+    path.reverse()
+    return tuple(path)
+
+  def set_expanded(self, value):
+    super(_VariableNode, self).set_expanded(value)
+    if self.is_expanded():
+      self._expanded_paths.add(self.path())
+    else:
+      self._expanded_paths.discard(self.path())
+
+  def child_handle_ids(self):
+    """Gets the handles that must be looked up to create the child nodes.
+
+    Returns:
+      A list of handle IDs.
+    """
+    return [p.ref() for p in self._value.properties()]
+
+  def create_children(self, handle_set):
+    """Creates the child nodes.
+
+    Args:
+      handle_set: HandleSet containing the values of child_handle_ids().
+
+    Returns:
+      A list of _VariableNodes.
+    """
+    nodes = []
     for p in self._value.properties():
-      handle_ids.append(p.ref())
+      key = p.name()
+      value = handle_set.get_value(p.ref())
+      nodes.append(_VariableNode(
+          self.view(), self._debugger, self, handle_set, key, value))
+    return nodes
+
+  def query_children(self, callback):
     def _on_query_values(handle_set):
-      nodes = []
-      for p in self._value.properties():
-        key = p.name()
-        value = handle_set.get_value(p.ref())
-        nodes.append(_VariableNode(
-            self.view(), self._debugger, handle_set, key, value))
-      callback(nodes)
-    self._debugger.query_values(handle_ids, _on_query_values)
+      callback(self.create_children(handle_set))
+    self._debugger.query_values(self.child_handle_ids(), _on_query_values)
 
 
 class _ScopeNode(_VariableNode):
-  def __init__(self, view, debugger, handle_set, scope, *args, **kwargs):
+  def __init__(self, view, debugger, parent, handle_set, scope,
+               *args, **kwargs):
     value = handle_set.get_value(scope.object_ref())
-    super(_ScopeNode, self).__init__(view, debugger, handle_set,
+    super(_ScopeNode, self).__init__(view, debugger, parent, handle_set,
                                      scope.scope_name(), value, *args, **kwargs)
     self._scope = scope
 
@@ -617,9 +1410,18 @@ class _ScopeNode(_VariableNode):
 
 
 class _RootVariablesNode(views.TreeNode):
-  def __init__(self, view, debugger, *args, **kwargs):
+  def __init__(self, view, debugger, expanded_paths, *args, **kwargs):
+    """Initializes the root of a variable tree.
+
+    Args:
+      view: View the tree is in.
+      debugger: Debugger.
+      expanded_paths: Set of the paths of all expanded nodes, shared by the
+                      trees of all frames of the same function.
+    """
     super(_RootVariablesNode, self).__init__(view, *args, **kwargs)
     self._debugger = debugger
+    self._expanded_paths = expanded_paths
     self._handle_set = None
     self._scopes = None
 
@@ -632,12 +1434,15 @@ class _RootVariablesNode(views.TreeNode):
   def has_children(self):
     return True if self._scopes else False
 
+  def expanded_paths(self):
+    return self._expanded_paths
+
   def query_children(self, callback):
     nodes = []
     if self._scopes:
       for scope in self._scopes:
-        nodes.append(_ScopeNode(self.view(), self._debugger, self._handle_set,
-                                scope))
+        nodes.append(_ScopeNode(self.view(), self._debugger, self,
+                                self._handle_set, scope))
     callback(nodes)
 
   def can_collapse(self):
@@ -649,6 +1454,20 @@ class _RootVariablesNode(views.TreeNode):
     self._scopes = scopes
     self.set_expanded(True)
 
+  def restore_expanded(self, callback):
+    """Re-expands the nodes that were expanded in previous pauses.
+    The tree is walked breadth-first with one batched lookup per depth, and is
+    not drawn, so that it can be shown in a single edit once done.
+
+    Args:
+      callback: Function called when all nodes have been expanded.
+    """
+    def _select_nodes(nodes):
+      return [node for node in nodes
+              if node.has_children() and node.path() in self._expanded_paths]
+    _expand_breadth_first(self._debugger, self.child_nodes() or [],
+                          _select_nodes, callback)
+
 
 class VariablesView(views.TreeView):
   """A view that displays scope variables.
@@ -661,33 +1480,154 @@ class VariablesView(views.TreeView):
       debugger: Debugger.
     """
     super(VariablesView, self).__init__(window, debugger, 'Variables',
-                                        *args, **kwargs)
+                                        virtual=True, *args, **kwargs)
     if window.num_groups() == 4:
       window.set_view_index(self._view, 3, 0)
     elif window.num_groups() > 1:
       window.set_view_index(self._view, 1, 0)
+    # Frame being shown
+    self._frame = None
+    # Variable trees of the frames shown during the current pause, by frame
+    # ordinal, so switching back to a frame needs no requests
+    self._root_nodes = {}
+    self._cache_epoch = None
+    # Paths of the expanded nodes, by (uri, function name), kept across pauses
+    self._expanded_paths = {}
+
+  def clear(self):
+    self._frame = None
+    self._root_nodes = {}
+    self._cache_epoch = None
+    super(VariablesView, self).clear()
+
+  def expand_all(self, max_depth, max_nodes, max_bytes, callback=None):
+    """Expands the last clicked node, or all scopes, breadth-first.
+    Each object is only expanded once, so cycles end the walk down that path.
+    The expanded nodes are not remembered across pauses, so the walk is never
+    repeated without the budgets that limit it.
 
-  def update(self, snapshot):
+    Args:
+      max_depth: Number of levels to expand.
+      max_nodes: Maximum number of nodes to add.
+      max_bytes: Maximum size of the text of the added nodes. Reached once
+                 a depth has been added, so the last depth may exceed it.
+      callback: Function called with the number of nodes added and the name
+                of the budget that ended the walk, if any.
+    """
+    root_node = self.root_node()
+    if not root_node:
+      return
+    node = self.selected_node()
+    if isinstance(node, _VariableNode):
+      start_node = node
+      nodes = [node]
+    else:
+      start_node = root_node
+      nodes = root_node.child_nodes() or []
+
+    # Objects that are already open above the start node are not expanded
+    # again
+    visited = set()
+    parent = None
+    if isinstance(start_node, _VariableNode):
+      parent = start_node.parent()
+    while isinstance(parent, _VariableNode):
+      visited.add(parent.value().handle_id())
+      parent = parent.parent()
+
+    state = {'depth': 0, 'nodes': 0, 'bytes': 0, 'limit': None}
+    def _select_nodes(nodes):
+      depth = state['depth']
+      state['depth'] += 1
+      for node in nodes:
+        state['bytes'] += len(node._get_row_text())
+      if depth >= max_depth:
+        state['limit'] = 'depth'
+        return []
+      if state['bytes'] >= max_bytes:
+        state['limit'] = 'size'
+        return []
+      selected_nodes = []
+      for node in nodes:
+        if not node.has_children():
+          continue
+        handle_id = node.value().handle_id()
+        if handle_id in visited:
+          continue
+        if node.child_nodes() is not None:
+          count = len(node.child_nodes())
+        else:
+          count = len(node.child_handle_ids())
+        if state['nodes'] + count > max_nodes:
+          state['limit'] = 'node count'
+          break
+        visited.add(handle_id)
+        state['nodes'] += count
+        selected_nodes.append(node)
+      return selected_nodes
+    def _on_expanded():
+      if root_node != self.root_node():
+        return
+      self.update_rows(start_node)
+      if callback:
+        callback(state['nodes'], state['limit'])
+    _expand_breadth_first(self.debugger(), nodes, _select_nodes, _on_expanded)
+
+  def update(self, snapshot, frame):
+    """Shows the variables of a frame.
+
+    Args:
+      snapshot: Snapshot of the current pause.
+      frame: Frame from the snapshot, or None to show nothing.
+    """
     debugger = self.debugger()
-    # TODO(benvanik); active frame
-    frame = snapshot.frames()[0]
+    self._frame = frame
+    if not frame:
+      self.reset(None)
+      return
+
+    epoch = debugger.pause_epoch()
+    if self._cache_epoch != epoch:
+      self._root_nodes = {}
+      self._cache_epoch = epoch
+    root_node = self._root_nodes.get(frame.ordinal(), None)
+    if root_node:
+      self.reset(root_node)
+      return
+
+    function_key = (frame.location()[0],
+                    frame.function_name(snapshot.handle_set()))
+    expanded_paths = self._expanded_paths.setdefault(function_key, set())
 
     def _on_frame_scopes(handle_set, scopes):
-      root_node = _RootVariablesNode(self.view(), self.debugger())
+      # Ignore results from a previous pause
+      if debugger.pause_epoch() != self._cache_epoch:
+        return
+      if frame.ordinal() in self._root_nodes:
+        _show(self._root_nodes[frame.ordinal()])
+        return
+      root_node = _RootVariablesNode(self.view(), debugger, expanded_paths)
       root_node.update(handle_set, scopes)
-      self.reset(root_node)
+      root_node.restore_expanded(lambda: _on_restored(root_node))
+    def _on_restored(root_node):
+      if debugger.pause_epoch() != self._cache_epoch:
+        return
+      self._root_nodes.setdefault(frame.ordinal(), root_node)
+      _show(self._root_nodes[frame.ordinal()])
+    def _show(root_node):
+      if frame == self._frame:
+        self.reset(root_node)
     debugger.query_frame_scopes(frame, _on_frame_scopes)
 
 
 class EventListener(sublime_plugin.EventListener):
-  def on_new(self, view):
-    plugin().get_source_view(view)
-
   def on_clone(self, view):
-    plugin().get_source_view(view)
+    plugin().index_view(view)
 
   def on_load(self, view):
-    source_view = plugin().get_source_view(view, create=True)
+    # Views opened for the active location already have a source view
+    source_view = plugin().get_source_view(view, create=False)
+    plugin().index_view(view)
     if source_view:
       source_view.on_load()
 
@@ -695,6 +1635,15 @@ class EventListener(sublime_plugin.EventListener):
     plugin().cleanup_source_view(view)
 
   def on_post_save(self, view):
+    # The file may have been saved under a new name
+    plugin().index_view(view)
+    source_view = plugin().get_source_view(view, create=False)
+    if source_view:
+      # Commit the lines of any breakpoints moved by edits
+      moves = source_view.get_breakpoint_moves()
+      if len(moves):
+        plugin().breakpoint_list().relocate_breakpoints(moves)
+
     # Notify all active debuggers that the given file has changed - they can
     # do what they want with that information
     uri = view.file_name()
@@ -708,8 +1657,18 @@ class EventListener(sublime_plugin.EventListener):
     custom_view = views.get_custom_view(view)
     if custom_view:
       custom_view.on_selection_modified()
+    else:
+      plugin().hover_evaluator().on_selection_modified(view)
+
+  def on_query_completions(self, view, prefix, locations):
+    return plugin().hover_evaluator().query_completions(view)
 
   def on_activated(self, view):
+    custom_view = views.get_custom_view(view)
+    if custom_view:
+      custom_view.on_activated()
+    # The file may have been renamed or moved outside of the editor
+    plugin().index_view(view)
     plugin().status_manager().update_view(view)
 
   def on_deactivated(self, view):
@@ -754,34 +1713,174 @@ class BreakpointListener(di.BreakpointListener):
     for debugger in plugin().debuggers():
       debugger.remove_breakpoint(breakpoint)
 
+  def on_breakpoints_move(self, breakpoints):
+    print 'EVENT: on_breakpoints_move'
+    # Views already show the moved lines, as the edits moved their regions
+    # Update all debuggers
+    for debugger in plugin().debuggers():
+      debugger.move_breakpoints(breakpoints)
+
+  def on_breakpoints_change(self, change_set):
+    print 'EVENT: on_breakpoints_change'
+    # Update all views, looking up the views of each file only once
+    # Moved breakpoints are already shown on their new lines
+    source_views_by_uri = {}
+    for uri in change_set.uris():
+      source_views_by_uri[uri] = list(plugin().source_views_for_uri(uri))
+    def _source_views_for(breakpoint):
+      if breakpoint.type() != 'location':
+        return []
+      return source_views_by_uri[breakpoint.location()[0]]
+    for breakpoint in change_set.removed():
+      for source_view in _source_views_for(breakpoint):
+        source_view.remove_breakpoint(breakpoint)
+    for breakpoint in change_set.added():
+      for source_view in _source_views_for(breakpoint):
+        source_view.add_breakpoint(breakpoint)
+    for breakpoint in change_set.changed():
+      for source_view in _source_views_for(breakpoint):
+        source_view.change_breakpoint(breakpoint)
+    # Update all debuggers
+    for debugger in plugin().debuggers():
+      debugger.apply_breakpoint_changes(change_set)
+
+  def on_exception_break_mode_change(self, mode):
+    print 'EVENT: on_exception_break_mode_change(%s)' % (mode)
+    for debugger in plugin().debuggers():
+      debugger.set_exception_break_mode(mode)
+
+
+class WatchListener(di.WatchListener):
+  """Handles watch list events.
+  """
+  def __init__(self, plugin, *args, **kwargs):
+    super(WatchListener, self).__init__(*args, **kwargs)
+    self._plugin = plugin
+
+  def on_watch_add(self, watch):
+    print 'EVENT: on_watch_add'
+    for debugger in plugin().debuggers():
+      debugger.listener().update_watches()
+
+  def on_watch_remove(self, watch):
+    print 'EVENT: on_watch_remove'
+    for debugger in plugin().debuggers():
+      debugger.listener().update_watches()
+
 
 class DebuggerListener(di.DebuggerListener):
   """Handles debugger events.
   """
-  def __init__(self, plugin, *args, **kwargs):
+  def __init__(self, plugin, is_reattach=False, *args, **kwargs):
+    """Initializes a debugger listener.
+
+    Args:
+      plugin: Parent plugin.
+      is_reattach: True if the instance has been attached to before.
+    """
     super(DebuggerListener, self).__init__(*args, **kwargs)
     self._plugin = plugin
+    self._is_reattach = is_reattach
     self._callstack_view = None
     self._variables_view = None
+    self._watch_view = None
+    self._snapshot = None
+    self._selected_frame = None
+
+  def snapshot(self):
+    return self._snapshot
+
+  def selected_frame(self):
+    return self._selected_frame
+
+  def variables_view(self):
+    return self._variables_view
+
+  def select_frame(self, frame):
+    """Selects the frame variables and watches are shown for.
+    The editor jumps to the location of the frame.
+
+    Args:
+      frame: Frame from the current snapshot.
+    """
+    if not self._snapshot or frame == self._selected_frame:
+      return
+    self._selected_frame = frame
+    if self._callstack_view:
+      self._callstack_view.set_selected_frame(frame)
+    if self._variables_view:
+      self._variables_view.update(self._snapshot, frame)
+    self.update_watches()
+    plugin().set_active_location(self.debugger(), frame.location())
+
+  def update_watches(self):
+    """Re-evaluates all watches in the selected frame.
+    All watches are evaluated in a single pipelined burst and the watch view is
+    updated once every result has arrived.
+    """
+    debugger = self.debugger()
+    snapshot = self._snapshot
+    if not snapshot or debugger.is_running():
+      return
+    watches = plugin().watch_list().watches()
+    if not len(watches) and not self._watch_view:
+      return
+    def _on_evaluated(responses):
+      # Ignore results from a previous pause
+      if snapshot != self._snapshot:
+        return
+      if not self._watch_view:
+        self._watch_view = WatchView(sublime.active_window(), debugger)
+      self._watch_view.update(watches, responses)
+    debugger.evaluate_all([watch.expression() for watch in watches],
+                          _on_evaluated, frame=self._selected_frame)
 
   def on_attach(self, *args, **kwargs):
     print 'EVENT: on_attach'
-    # Add all breakpoints
+    # Add all breakpoints, reconciling with those left in the target if we
+    # have been attached to it before
     debugger = self.debugger()
 
     breakpoint_list = plugin().breakpoint_list()
-    for breakpoint in breakpoint_list.breakpoints():
-      debugger.add_breakpoint(breakpoint)
+    debugger.sync_breakpoints(breakpoint_list.breakpoints(),
+                              reconcile=self._is_reattach)
+
+  def on_breakpoint_resolve(self, breakpoint, location, *args, **kwargs):
+    print 'EVENT: on_breakpoint_resolve'
+    location_uri = breakpoint.location()[0]
+    for source_view in plugin().source_views_for_uri(location_uri):
+      source_view.resolve_breakpoint(breakpoint, location)
+    if not location:
+      plugin().show_status_message(
+          'Breakpoint at line %s did not resolve to any code' % (
+              breakpoint.location()[1]))
+
+  def on_breakpoints_ready(self, *args, **kwargs):
+    print 'EVENT: on_breakpoints_ready'
+    plugin().show_status_message('Breakpoints set')
 
   def on_detach(self, reason, *args, **kwargs):
     print 'EVENT: on_detach(%s)' % (reason)
     plugin().remove_debugger(self.debugger())
     plugin().clear_active_location()
 
+    # Draw breakpoints where they were set again
+    breakpoint_list = plugin().breakpoint_list()
+    for breakpoint_id in self.debugger().resolved_locations().keys():
+      breakpoint = breakpoint_list.get_breakpoint(breakpoint_id)
+      if breakpoint and breakpoint.type() == 'location':
+        location_uri = breakpoint.location()[0]
+        for source_view in plugin().source_views_for_uri(location_uri):
+          source_view.clear_breakpoint_resolution(breakpoint)
+
     if self._callstack_view:
       self._callstack_view.close()
     if self._variables_view:
       self._variables_view.close()
+    if self._watch_view:
+      self._watch_view.close()
+    self._snapshot = None
+    self._selected_frame = None
 
     status_manager = self._plugin.status_manager()
     detach_message = 'Detached'
@@ -797,6 +1896,8 @@ class DebuggerListener(di.DebuggerListener):
 
   def on_resume(self, *args, **kwargs):
     print 'EVENT: on_resume'
+    self._snapshot = None
+    self._selected_frame = None
     plugin().clear_active_location()
     if self._callstack_view:
       self._callstack_view.clear()
@@ -822,6 +1923,11 @@ class DebuggerListener(di.DebuggerListener):
       for var in frame.local_refs():
         print '    %s = %s' % (var[0], handle_set.get_value(var[1]))
 
+    self._snapshot = snapshot
+    self._selected_frame = None
+    if len(snapshot.frames()):
+      self._selected_frame = snapshot.frames()[0]
+
     debugger = self.debugger()
     if not self._callstack_view:
       self._callstack_view = CallstackView(sublime.active_window(), debugger)
@@ -830,7 +1936,8 @@ class DebuggerListener(di.DebuggerListener):
     if not self._variables_view:
       self._variables_view = VariablesView(sublime.active_window(), debugger)
     self._variables_view.focus()
-    self._variables_view.update(snapshot)
+    self._variables_view.update(snapshot, self._selected_frame)
+    self.update_watches()
 
   def on_break(self, location, breakpoints_hit, *args, **kwargs):
     print 'EVENT: on_break(%s@%s:%s)' % (location[0], location[1], location[2])
@@ -842,9 +1949,15 @@ class DebuggerListener(di.DebuggerListener):
                    *args, **kwargs):
     print 'EVENT: on_exception(%s@%s:%s)' % (location[0], location[1],
                                              location[2])
-    self._update_snapshot(snapshot)
     plugin().set_active_location(self.debugger(), location)
 
+  def on_exception_throttled(self, location, *args, **kwargs):
+    print 'EVENT: on_exception_throttled(%s@%s:%s)' % (location[0],
+                                                       location[1],
+                                                       location[2])
+    self._plugin.show_status_message(
+        'Ignoring repeated exceptions at %s:%s' % (location[0], location[1]))
+
 
 class _WindowCommand(sublime_plugin.WindowCommand):
   """Global command, executed via command palette or key presses.
@@ -920,6 +2033,68 @@ class StdiToggleAllBreakpoints(_WindowCommand):
   """
   def run(self, action):
     print 'toggle all breakpoints: %s' % (action)
+    breakpoint_list = plugin().breakpoint_list()
+    breakpoint_list.set_all_enabled(action == 'enable')
+    plugin().show_status_message('%sd all breakpoints' % (action.title()))
+
+  def is_enabled(self, action):
+    return len(plugin().breakpoint_list().breakpoints()) > 0
+
+
+class StdiToggleBreakpointGroupCommand(_WindowCommand):
+  """Enables/disables all breakpoints in a group picked from a list.
+  """
+  def run(self, action):
+    groups = plugin().breakpoint_list().groups()
+    def _item_selected(index):
+      if index == -1:
+        return
+      breakpoint_list = plugin().breakpoint_list()
+      breakpoint_list.set_group_enabled(groups[index], action == 'enable')
+      plugin().show_status_message('%sd breakpoint group %s' % (
+          action.title(), groups[index]))
+    self.window.show_quick_panel(groups, _item_selected)
+
+  def is_enabled(self, action):
+    return len(plugin().breakpoint_list().groups()) > 0
+
+
+class StdiClearFileBreakpointsCommand(_WindowCommand):
+  """Removes all breakpoints in the current file.
+  """
+  def run(self):
+    uri = self.get_view_uri()
+    if not uri:
+      return
+    breakpoint_list = plugin().breakpoint_list()
+    breakpoints = breakpoint_list.get_breakpoints_in_file(uri)
+    breakpoint_list.remove_breakpoints(breakpoints)
+    plugin().show_status_message('Removed %s breakpoints' % (len(breakpoints)))
+
+  def is_enabled(self):
+    uri = self.get_view_uri()
+    if not uri:
+      return False
+    breakpoint_list = plugin().breakpoint_list()
+    return breakpoint_list.has_breakpoints_in_file(uri)
+
+
+class StdiSetExceptionBreakModeCommand(_WindowCommand):
+  """Sets which exceptions cause debuggers to break.
+  """
+  def run(self, mode):
+    breakpoint_list = plugin().breakpoint_list()
+    breakpoint_list.set_exception_break_mode(mode)
+    if mode == di.ExceptionBreakMode.ALL:
+      plugin().show_status_message('Breaking on all exceptions')
+    elif mode == di.ExceptionBreakMode.UNCAUGHT:
+      plugin().show_status_message('Breaking on uncaught exceptions')
+    else:
+      plugin().show_status_message('Not breaking on exceptions')
+
+  def is_enabled(self, mode):
+    breakpoint_list = plugin().breakpoint_list()
+    return breakpoint_list.exception_break_mode() != mode
 
 
 class StdiLaunchDebuggerCommand(_WindowCommand):
@@ -1036,9 +2211,28 @@ class StdiEvaluate(_WindowCommand):
   """
   def run(self):
     debugger = self.get_debugger()
-    # TODO(benvanik): show an input panel, ask for expression
-    #plugin().show_status_message('Evaluating expression...')
-    #debugger.evaluate()
+    def _on_evaluate(expression, response):
+      result = _format_evaluate_response(response)
+      print 'STDI: %s = %s' % (expression, result)
+      if response.is_success() and response.value():
+        print response.handle_set().print_value(expression,
+                                                response.value().handle_id(),
+                                                max_size=64 * 1024)
+      plugin().show_status_message('%s = %s' % (expression, result))
+    def _on_done(expression):
+      expression = expression.strip()
+      if not len(expression):
+        return
+      plugin().show_status_message('Evaluating expression...')
+      frame = debugger.listener().selected_frame()
+      debugger.evaluate(expression,
+                        lambda response: _on_evaluate(expression, response),
+                        frame=frame)
+    input_view = self.window.show_input_panel(
+        'Evaluate:',
+        _get_selected_text(self.window.active_view()),
+        _on_done, None, None)
+    input_view.run_command('select_all')
 
   def is_enabled(self):
     debugger = self.get_debugger()
@@ -1048,6 +2242,95 @@ class StdiEvaluate(_WindowCommand):
     return self.get_debugger()
 
 
+def _get_selected_text(view):
+  """Gets the text of the first selection in the given view.
+
+  Args:
+    view: View, or None.
+
+  Returns:
+    The selected text or an empty string if nothing is selected.
+  """
+  if not view or not len(view.sel()):
+    return ''
+  return view.substr(view.sel()[0]).strip()
+
+
+class StdiExpandVariablesCommand(_WindowCommand):
+  """Expands the last clicked variable, or all scopes, a number of levels.
+  Budgets are read from the 'debug_expand_max_depth', 'debug_expand_max_nodes'
+  and 'debug_expand_max_bytes' settings.
+  """
+  def run(self, levels=None, prompt=False):
+    settings = self.window.active_view().settings()
+    max_depth = settings.get('debug_expand_max_depth', 8)
+    max_nodes = settings.get('debug_expand_max_nodes', 2000)
+    max_bytes = settings.get('debug_expand_max_bytes', 256 * 1024)
+    variables_view = self.get_debugger().listener().variables_view()
+    def _on_expanded(node_count, limit):
+      message = 'Expanded %s variables' % (node_count)
+      if limit:
+        message += ' (stopped at %s limit)' % (limit)
+      plugin().show_status_message(message)
+    def _expand(levels):
+      variables_view.expand_all(min(levels or max_depth, max_depth),
+                                max_nodes, max_bytes, _on_expanded)
+    if not prompt:
+      _expand(levels)
+      return
+    def _on_done(value):
+      try:
+        levels = int(value.strip())
+      except ValueError:
+        return
+      if levels > 0:
+        _expand(levels)
+    self.window.show_input_panel(
+        'Levels:', str(levels or 2), _on_done, None, None)
+
+  def is_enabled(self):
+    debugger = self.get_debugger()
+    return (debugger and not debugger.is_running() and
+            debugger.listener().variables_view())
+
+  def is_visible(self):
+    return self.get_debugger()
+
+
+class StdiAddWatchCommand(_WindowCommand):
+  """Adds a new watch expression, defaulting to the selected text.
+  """
+  def run(self):
+    def _on_done(expression):
+      expression = expression.strip()
+      if not len(expression):
+        return
+      plugin().watch_list().create_watch(expression)
+    input_view = self.window.show_input_panel(
+        'Watch Expression:',
+        _get_selected_text(self.window.active_view()),
+        _on_done, None, None)
+    input_view.run_command('select_all')
+
+
+class StdiRemoveWatchCommand(_WindowCommand):
+  """Removes a watch expression chosen from a list.
+  """
+  def run(self):
+    watch_list = plugin().watch_list()
+    watches = watch_list.watches()
+    def _item_selected(index):
+      if index == -1:
+        return
+      watch_list.remove_watch(watches[index])
+    self.window.show_quick_panel(
+        [watch.expression() for watch in watches], _item_selected,
+        sublime.MONOSPACE_FONT)
+
+  def is_enabled(self):
+    return len(plugin().watch_list().watches()) > 0
+
+
 class _ContextCommand(_WindowCommand):
   """Context menu command.
   """
@@ -1058,7 +2341,7 @@ class _ContextCommand(_WindowCommand):
 
     Args:
       include_column: True to include the column number, otherwise it will be
-                      0 to indicate the entire line.
+                      1 to indicate the entire line.
 
     Returns:
       A (uri, line, column) location or None if no selection.
@@ -1110,8 +2393,12 @@ class _BreakpointContextCommand(_ContextCommand):
     location = self.get_location()
     if not location:
       return
+    (uri, line, column) = location
     breakpoint_list = plugin().breakpoint_list()
-    return breakpoint_list.get_breakpoint_at_location(location)
+    breakpoints = breakpoint_list.get_breakpoints_in_range(uri, line, line)
+    if len(breakpoints):
+      return breakpoints[0]
+    return None
 
 
 class StdiAddRemoveBreakpointCommand(_BreakpointContextCommand):
@@ -1195,6 +2482,37 @@ class StdiEditBreakpointConditionCommand(_BreakpointContextCommand):
       return 'Condition: \'%s\'...' % (breakpoint.condition())
 
 
+class StdiSetBreakpointGroupCommand(_BreakpointContextCommand):
+  """Edits the group of the breakpoint on the clicked line.
+  """
+  def run(self):
+    breakpoint = self.get_line_breakpoint()
+    if not breakpoint:
+      return
+    def _on_done(new_value):
+      new_value = new_value.strip()
+      if not len(new_value):
+        new_value = None
+      breakpoint.set_group(new_value)
+    input_view = self.window.show_input_panel(
+        'Group:',
+        breakpoint.group() or '',
+        _on_done, None, None)
+    input_view.run_command('select_all')
+
+  def is_visible(self):
+    if not super(StdiSetBreakpointGroupCommand, self).is_visible():
+      return False
+    return self.get_line_breakpoint()
+
+  def description(self):
+    breakpoint = self.get_line_breakpoint()
+    if not breakpoint or not breakpoint.group():
+      return 'Set Group...'
+    else:
+      return 'Group: \'%s\'...' % (breakpoint.group())
+
+
 class StdiIgnoreBreakpointCommand(_BreakpointContextCommand):
   """Edits the breakpoint ignore count on the clicked line.
   """
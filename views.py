@@ -3,6 +3,7 @@
 __author__ = 'benvanik@google.com (Ben Vanik)'
 
 
+import bisect
 import sublime
 import sublime_plugin
 
@@ -97,43 +98,296 @@ class CustomView(object):
   def on_selection_modified(self):
     pass
 
+  def on_activated(self):
+    pass
+
 
 class TreeView(CustomView):
   """A ST view displaying a navigable.
+
+  The visible nodes are kept as a flat list of rows in display order, along
+  with the offset each written row starts at. Expanding or collapsing a node
+  splices its descendants in or out and rewrites only their rows, shifting the
+  offsets of the rows after them, and clicks are resolved to rows by bisecting
+  the row offsets.
+
+  In virtual mode only the first rows are written to the view, followed by a
+  line counting the rest. More rows are written when the view is activated or
+  its selection changes while the visible region is near the end of the
+  written rows, or when the line counting the rest is clicked, so the cost of
+  an expansion is bounded by what is on screen rather than by the size of the
+  tree.
   """
-  def __init__(self, window, debugger, title, *args, **kwargs):
+  # Number of rows written past the visible region in virtual mode
+  _VIRTUAL_PAGE_SIZE = 200
+  # Region key of the expandable row icons
+  _ICON_KEY = 'stdi_tree_expandable'
+
+  def __init__(self, window, debugger, title, virtual=False, *args, **kwargs):
     """Initializes a tree view.
 
     Args:
       window: Target sublime window.
       debugger: Debugger.
       title: View title.
+      virtual: True to only write the rows near the visible region.
     """
     super(TreeView, self).__init__(window, debugger, title, *args, **kwargs)
     self._root_node = None
+    self._is_virtual = virtual
+    # All visible nodes in display order
+    self._rows = []
+    # Offsets of the rows written to the view, and the end of the last one
+    self._row_starts = []
+    self._rows_end = 0
+    # Node last clicked
+    self._selected_node = None
 
   def root_node(self):
     return self._root_node
 
+  def selected_node(self):
+    return self._selected_node
+
+  def is_virtual(self):
+    return self._is_virtual
+
   def clear(self):
     self._root_node = None
+    self._selected_node = None
+    self._rows = []
+    self._row_starts = []
+    self._rows_end = 0
+    self.view().erase_regions(self._ICON_KEY)
     super(TreeView, self).clear()
 
   def reset(self, root_node):
     self.view().sel().clear()
     self._root_node = root_node
+    self._selected_node = None
+    self._rows = []
+    if self._root_node:
+      self._rows = [self._root_node] + self._flatten(self._root_node)
+    self._row_starts = []
+    self._rows_end = 0
+    self._render_rows(0, self._VIRTUAL_PAGE_SIZE)
+
+  def _flatten(self, node):
+    """Lists the visible descendants of a node in display order.
+
+    Args:
+      node: TreeNode.
+
+    Returns:
+      A list of TreeNodes, not including the node itself.
+    """
+    rows = []
+    stack = []
+    if node.is_expanded() and node.child_nodes():
+      stack.extend(reversed(node.child_nodes()))
+    while len(stack):
+      node = stack.pop()
+      rows.append(node)
+      if node.is_expanded() and node.child_nodes():
+        stack.extend(reversed(node.child_nodes()))
+    return rows
+
+  def _row_index(self, node):
+    """Finds the row a node is shown in.
+    The row the node was last written or clicked at is checked first, so the
+    rows are only searched if rows before it have been replaced since.
+
+    Args:
+      node: TreeNode.
+
+    Returns:
+      The index of the row, or -1 if the node is not visible.
+    """
+    index = node._row_hint
+    if 0 <= index < len(self._rows) and self._rows[index] is node:
+      return index
+    try:
+      index = self._rows.index(node)
+    except ValueError:
+      return -1
+    node._row_hint = index
+    return index
+
+  def update_rows(self, node):
+    """Replaces the rows of the descendants of a node.
+    Must be called when a node is expanded or collapsed, or when any of its
+    descendants are expanded without updating the view.
+
+    Args:
+      node: TreeNode.
+    """
+    index = self._row_index(node)
+    if index == -1:
+      return
+    end = index + 1
+    while (end < len(self._rows) and
+           self._rows[end].tree_level() > node.tree_level()):
+      end += 1
+    rows = self._flatten(node)
+    self._rows[index + 1:end] = rows
+    old_count = end - index - 1
+    # In virtual mode a span that grows by more than a page is cut off at the
+    # written rows instead, which leaves the rows after it unwritten
+    if (end <= len(self._row_starts) and
+        (not self._is_virtual or
+         len(rows) - old_count <= self._VIRTUAL_PAGE_SIZE)):
+      self._replace_rows(index + 1, old_count, len(rows))
+    else:
+      self._render_rows(index + 1, len(self._row_starts))
+
+  def _format_rows(self, first, count, point):
+    """Formats rows for writing to the view.
+
+    Args:
+      first: Index of the first row.
+      count: Number of rows.
+      point: Offset the first row will be written at.
+
+    Returns:
+      A tuple of (row text, row offsets, icon regions, end offset).
+    """
+    lines = []
+    row_starts = []
+    icon_regions = []
+    index = first
+    for node in self._rows[first:first + count]:
+      s = node._get_row_text()
+      node._row_hint = index
+      index += 1
+      row_starts.append(point)
+      if node.has_children():
+        icon_regions.append(sublime.Region(point, point))
+      lines.append(s)
+      point += len(s)
+    return (''.join(lines), row_starts, icon_regions, point)
+
+  def _replace_rows(self, first, old_count, count):
+    """Rewrites a span of written rows that has been replaced.
+    The rows after the span are left in the view, and only their offsets are
+    shifted by the change in length. All rows of the new span are written, so
+    the count of rows not yet written in virtual mode is unchanged.
+
+    Args:
+      first: Index of the first row of the span.
+      old_count: Number of rows the span had when it was written.
+      count: Number of rows now in the span.
+    """
     view = self.view()
+    old_end = first + old_count
+    if first < len(self._row_starts):
+      start_point = self._row_starts[first]
+    else:
+      start_point = self._rows_end
+    if old_end < len(self._row_starts):
+      end_point = self._row_starts[old_end]
+    else:
+      end_point = self._rows_end
+    (text, row_starts, icon_regions, point) = self._format_rows(
+        first, count, start_point)
+    delta = point - end_point
+    self._row_starts[first:old_end] = row_starts
+    if delta:
+      after = first + count
+      self._row_starts[after:] = [
+          row_start + delta for row_start in self._row_starts[after:]]
+      self._rows_end += delta
+
+    # Icons of the rows after the span move with them
+    regions = []
+    for region in view.get_regions(self._ICON_KEY):
+      if region.begin() < start_point:
+        regions.append(region)
+      elif region.begin() >= end_point:
+        regions.append(sublime.Region(region.begin() + delta,
+                                      region.begin() + delta))
     view.set_read_only(False)
     edit = view.begin_edit()
-    view.erase(edit, sublime.Region(0, view.size()))
-    if self._root_node:
-      self._root_node._insert_into_view(edit, 0)
+    view.replace(edit, sublime.Region(start_point, end_point), text)
+    view.add_regions(self._ICON_KEY, regions + icon_regions, '', 'dot',
+                     sublime.HIDDEN)
+    view.end_edit(edit)
+    view.set_read_only(True)
+
+  def _render_rows(self, first, count):
+    """Rewrites the rows from the given row on.
+
+    Args:
+      first: Index of the first row that changed.
+      count: Number of rows that should be written to the view. Only used in
+             virtual mode, as all rows are written otherwise.
+    """
+    view = self.view()
+    first = min(first, len(self._row_starts))
+    if self._is_virtual:
+      count = min(len(self._rows), max(count, self._VIRTUAL_PAGE_SIZE))
+    else:
+      count = len(self._rows)
+    if first < len(self._row_starts):
+      start_point = self._row_starts[first]
+    else:
+      start_point = self._rows_end
+
+    # Rows before the change keep their offsets
+    del self._row_starts[first:]
+    (text, row_starts, icon_regions, point) = self._format_rows(
+        first, count - first, start_point)
+    self._row_starts.extend(row_starts)
+    self._rows_end = point
+    remaining = len(self._rows) - count
+    if remaining > 0:
+      text += '  ... %s more\n' % (remaining)
+
+    view.set_read_only(False)
+    edit = view.begin_edit()
+    view.erase(edit, sublime.Region(start_point, view.size()))
+    view.insert(edit, start_point, text)
+    # Keep the icons of the rows before the change
+    regions = [region for region in view.get_regions(self._ICON_KEY)
+               if region.begin() < start_point]
+    view.add_regions(self._ICON_KEY, regions + icon_regions, '', 'dot',
+                     sublime.HIDDEN)
     view.end_edit(edit)
     view.set_read_only(True)
 
+  def _update_viewport(self):
+    """Writes more rows if the visible region is near the last written row.
+    """
+    if get_custom_view(self._view) != self:
+      return
+    rendered_count = len(self._row_starts)
+    if rendered_count >= len(self._rows):
+      return
+    view = self.view()
+    last_row = view.rowcol(view.visible_region().end())[0]
+    if last_row + self._VIRTUAL_PAGE_SIZE / 2 >= rendered_count:
+      self._render_rows(rendered_count, last_row + self._VIRTUAL_PAGE_SIZE)
+
+  def node_at_point(self, point):
+    """Finds the node shown at a point.
+
+    Args:
+      point: Offset in the view.
+
+    Returns:
+      A TreeNode, or None if the point is not on a written row.
+    """
+    if point >= self._rows_end:
+      return None
+    row = bisect.bisect_right(self._row_starts, point) - 1
+    if row < 0:
+      return None
+    self._rows[row]._row_hint = row
+    return self._rows[row]
+
   def on_selection_modified(self):
     if not self._root_node:
       return
+    self._update_viewport()
     point = 0
     for region in self.view().sel():
       point = region.begin()
@@ -141,14 +395,24 @@ class TreeView(CustomView):
     if point == 0:
       return
     self.view().sel().clear()
-    self._root_node.on_click(point)
+    node = self.node_at_point(point)
+    if node:
+      self._selected_node = node
+      node.set_expanded(not node.is_expanded())
+    elif len(self._row_starts) < len(self._rows):
+      # Clicked the line counting the rows not yet written
+      rendered_count = len(self._row_starts)
+      self._render_rows(rendered_count,
+                        rendered_count + self._VIRTUAL_PAGE_SIZE)
+
+  def on_activated(self):
+    if self._root_node:
+      self._update_viewport()
 
 
 class TreeNode(object):
   """An individual node in a tree view.
   """
-  _next_key_id = 0
-
   def __init__(self, view, *args, **kwargs):
     """Initializers a tree node.
 
@@ -156,16 +420,19 @@ class TreeNode(object):
       view: View the tree is in.
     """
     self._view = view
-    self._region_key = str(TreeNode._next_key_id)
-    TreeNode._next_key_id += 1
     self._is_expanded = False
     self._is_expanding = False
     self._child_nodes = None
     self._tree_level = 0
+    # Row the node was last shown in, which may be stale
+    self._row_hint = -1
 
   def view(self):
     return self._view
 
+  def tree_view(self):
+    return get_custom_view(self._view)
+
   def label(self):
     return ''
 
@@ -184,21 +451,19 @@ class TreeNode(object):
   def is_expanded(self):
     return self._is_expanded
 
+  def child_nodes(self):
+    return self._child_nodes
+
   def set_expanded(self, value):
-    view = self.view()
     if self._is_expanded == value:
       return
     if not self.can_collapse() and not value:
       return
     self._is_expanded = value
     if not self._is_expanded:
-      if self._child_nodes:
-        view.set_read_only(False)
-        edit = view.begin_edit()
-        for node in self._child_nodes:
-          node._remove_from_view(edit)
-        view.end_edit(edit)
-        view.set_read_only(True)
+      tree_view = self.tree_view()
+      if tree_view:
+        tree_view.update_rows(self)
     else:
       if self._is_expanding:
         return
@@ -210,64 +475,43 @@ class TreeNode(object):
         if not self._is_expanded:
           return
         self._child_nodes = child_nodes
-        regions = view.get_regions(self._region_key)
-        end_point = regions[0].end() if len(regions) else 0
-        view.set_read_only(False)
-        edit = view.begin_edit()
         for node in self._child_nodes:
           node._set_tree_level(self._tree_level + 1)
-          end_point = node._insert_into_view(edit, end_point)
-        view.end_edit(edit)
-        view.set_read_only(True)
+        tree_view = self.tree_view()
+        if tree_view:
+          tree_view.update_rows(self)
       if self._child_nodes:
         _on_query_children(self._child_nodes)
       else:
         self.query_children(_on_query_children)
 
+  def _expand_with(self, child_nodes):
+    """Expands the node with the given children without updating the view.
+    Used to build up a tree before it is shown.
+
+    Args:
+      child_nodes: A list of TreeNodes.
+    """
+    self._is_expanded = True
+    self._child_nodes = child_nodes
+    for node in self._child_nodes:
+      node._set_tree_level(self._tree_level + 1)
+
   def tree_level(self):
     return self._tree_level
 
   def _set_tree_level(self, value):
     self._tree_level = value
 
-  def _insert_into_view(self, edit, point):
-    indent = ''
-    for n in range(self._tree_level):
-      indent += '  '
-    node_value = self.label()
+  def _get_row_text(self):
+    """Formats the line the node is shown as.
+
+    Returns:
+      The indented label and description, ending with a newline.
+    """
+    indent = '  ' * self._tree_level
+    node_value = '%s' % (self.label())
     description = self.description()
     if description:
       node_value = '%s: %s' % (node_value, description)
-    node_text = '%s%s\n' % (indent, node_value)
-    end_point = point + self._view.insert(edit, point, node_text)
-    region = sublime.Region(point, end_point)
-    scope = ''
-    icon = 'dot' if self.has_children() else ''
-    self._view.add_regions(self._region_key, [region], scope, icon,
-                           sublime.HIDDEN)
-    if self._child_nodes:
-      for node in self._child_nodes:
-        end_point = node._insert_into_view(edit, end_point)
-    return end_point
-
-  def _remove_from_view(self, edit):
-    if self._child_nodes:
-      for node in self._child_nodes:
-        node._remove_from_view(edit)
-    regions = self._view.get_regions(self._region_key)
-    for region in regions:
-      self._view.erase(edit, region)
-    self._view.erase_regions(self._region_key)
-
-  def on_click(self, point):
-    # Test node
-    regions = self._view.get_regions(self._region_key)
-    for region in regions:
-      if region.contains(point):
-        self.set_expanded(not self.is_expanded())
-    # Test children
-    # TODO(benvanik): child region range for fast detection/etc
-    if self._child_nodes:
-      for node in self._child_nodes:
-        node.on_click(point)
-
+    return '%s%s\n' % (indent, node_value.replace('\n', ' '))